@@ -0,0 +1,93 @@
+# aho_corasick.py
+# Multi-pattern substring matcher (Aho-Corasick automaton).
+# Every pattern is compiled once into a trie with failure links, so scanning a
+# message is one pass over its characters plus one step per match reported.
+# Limits (benchmarks/bench_faq_match.py, 50 -> 100k FAQ rows):
+#   - scanning is not flat: IntentRouter.classify() goes ~15 -> ~42 us per message.
+#     Matches and failure hops per character stay constant; the extra time is cache
+#     misses walking a trie of millions of per-node dicts, so it grows with the trie
+#     size, not with the number of overlapping matches.
+#   - build() is pure Python and holds the GIL: ~3.5 ms at 50 rows, ~12 s at 100k.
+#     faq_store rebuilds on every FAQ hot reload in a background thread, but request
+#     threads in that worker share the GIL and slow down until it finishes. With a
+#     snapshot dir, only the first worker builds; the others load faq-<digest>.pkl.
+#   - below ~500 rows the old linear `q in text` scan is faster; this pays off above that.
+from collections import deque
+
+
+class AhoCorasick:
+    def __init__(self):
+        # node i -> {char: next node}; node 0 is the root
+        self._goto = [{}]
+        self._fail = [0]
+        # pattern index stored on the node where that pattern ends (-1 = none)
+        self._terminal = [-1]
+        # nearest node on the failure chain that ends a pattern (dictionary link)
+        self._dict_link = [-1]
+        self.patterns = []
+        self.values = []
+        self._built = False
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def add(self, pattern, value):
+        """Register `pattern`; later duplicates are ignored so the first one keeps its value."""
+        if not pattern:
+            return
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._terminal.append(-1)
+                self._dict_link.append(-1)
+            node = nxt
+        if self._terminal[node] == -1:
+            self._terminal[node] = len(self.patterns)
+            self.patterns.append(pattern)
+            self.values.append(value)
+        self._built = False
+
+    def build(self):
+        goto, fail, terminal = self._goto, self._fail, self._terminal
+        queue = deque()
+        for child in goto[0].values():
+            fail[child] = 0
+            self._dict_link[child] = -1
+            queue.append(child)
+
+        # breadth-first so every failure target is finished before it is used
+        while queue:
+            node = queue.popleft()
+            for ch, child in goto[node].items():
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                target = goto[f].get(ch, 0)
+                fail[child] = target if target != child else 0
+                f = fail[child]
+                self._dict_link[child] = f if terminal[f] != -1 else self._dict_link[f]
+                queue.append(child)
+        self._built = True
+        return self
+
+    def iter_matches(self, text):
+        """Yield (start, end, pattern_index) for every pattern occurring in `text`."""
+        if not self._built:
+            self.build()
+        goto, fail, terminal, dict_link = self._goto, self._fail, self._terminal, self._dict_link
+        patterns = self.patterns
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            hit = node if terminal[node] != -1 else dict_link[node]
+            while hit != -1:
+                idx = terminal[hit]
+                yield i + 1 - len(patterns[idx]), i + 1, idx
+                hit = dict_link[hit]
@@ -1,51 +1,153 @@
 # backend/app.py
 # Full working backend with admin, employee, client, attendance, products, chat (AI + human) +
-# emoji-safe MySQL utf8mb4 setup. (Verbose comments + emoji markers as requested)
-from flask import Flask, request, jsonify, send_from_directory
-from flask_cors import CORS
-from flask_mysqldb import MySQL
+# emoji-safe MySQL utf8mb4 setup, leveled logging and Prometheus metrics at /metrics.
 from dotenv import load_dotenv
+
+# load environment vars from .env first: logging and the project modules below (nlp_model,
+# response cache, generation budget, inference client, ...) read their settings at import time
+load_dotenv()
+
+from flask import Flask, Blueprint, current_app, g, has_request_context, request, jsonify, send_from_directory, \
+    Response, stream_with_context
+from flask_cors import CORS
+import logging
 import os
+import hashlib
+import json
 import random
+import threading
+import time
 import bcrypt
-from nlp_model import nlp_model_respond
 
-# load environment vars from .env
-load_dotenv()
+# configured before nlp_model is imported: it logs while loading the FAQ index
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
 
-app = Flask(__name__)
+from config import FRONTEND_ORIGINS
+from metrics import REGISTRY, CONTENT_TYPE, TimedConnection
+from db_pool import PooledMySQL
+from chat_log_writer import ChatLogWriter, ChatLogBacklogFull, chat_log_row, insert_chat_logs
+from pubsub import EventBroker
+from summary_counters import SummaryCounters
+from product_catalog import ProductCatalog, parse_price
+from product_search import ProductSearchIndex
+from nlp_model import nlp_model_route, nlp_model_stream, reset_conversation, start_model_warmup, readiness, MODEL_LOAD
+from worker_memory import worker_report
+
+log = logging.getLogger("app")
 
 # ------------------------
-# CORS - allow frontend only
+# Metrics: request latency per route, DB time per route + statement kind
 # ------------------------
-CORS(app, resources={r"/*": {"origins": ["http://localhost:3000", "http://127.0.0.1:3000", "https://ruric.vercel.app"]}},
-     supports_credentials=True)
+# after_request runs before a streamed body is iterated, so SSE / /chat/stream time the view only
+HTTP_SECONDS = REGISTRY.histogram("ruric_http_request_seconds",
+                                  "HTTP request latency (streamed responses: until the view returns, body excluded)",
+                                  ["endpoint", "method", "status"])
+DB_SECONDS = REGISTRY.histogram("ruric_db_seconds", "Time spent in MySQL calls", ["endpoint", "op"])
+DB_ERRORS = REGISTRY.counter("ruric_db_errors", "MySQL calls that raised", ["endpoint", "op"])
+
+
+class TimedMySQL(PooledMySQL):
+    # every cursor / commit made through mysql.connection is timed into DB_SECONDS
+    @property
+    def connection(self):
+        conn = super().connection
+        if conn is None:
+            return None
+        endpoint = request.endpoint if has_request_context() else None
+        return TimedConnection(conn, DB_SECONDS, DB_ERRORS, endpoint=endpoint or "none")
+
+
+# pooled connections, checked out lazily on first use in a request and returned at teardown —
+# never opened at import time, so a gunicorn --preload master forks without any database socket
+mysql = TimedMySQL()
+# optional write-behind for chat_logs rows (CHAT_LOG_WRITE_BEHIND=1); off = insert + commit in the request
+chat_logs = ChatLogWriter()
+# push channel for new chat messages (in-process; PUBSUB_SOCKET=... fans out across workers via pubsub.py)
+events = EventBroker()
+# /admin/summary counts: recounted in the background, bumped by signup / attendance writes
+summary = SummaryCounters()
+# /products snapshot: loaded once, revalidated every PRODUCTS_CACHE_TTL s, served with an ETag
+catalog = ProductCatalog()
+# /products/search: inverted index kept in step with catalog snapshots (only changed products re-indexed)
+product_search = ProductSearchIndex()
+catalog.on_reload(product_search.apply)
+# every route lives on this blueprint; create_app() wires it into a configured Flask app
+api = Blueprint('api', __name__)
+
 
 # ------------------------
-# MySQL config
+# Application factory
+# - gunicorn.conf.py imports this in the master (preload_app), loads the model there and
+#   forks workers that share the weights copy-on-write
 # ------------------------
-app.config['MYSQL_HOST'] = os.getenv("DB_HOST", "localhost")
-app.config['MYSQL_USER'] = os.getenv("DB_USER", "root")
-app.config['MYSQL_PASSWORD'] = os.getenv("DB_PASSWORD", "")
-app.config['MYSQL_DB'] = os.getenv("DB_NAME", "ruri_club")
-# flask_mysqldb will return tuples by default
-mysql = MySQL(app)
+def create_app():
+    app = Flask(__name__)
+
+    # CORS - allow frontend only; custom response headers must be exposed or fetch() can't read them
+    CORS(app, resources={r"/*": {"origins": list(FRONTEND_ORIGINS)}},
+         supports_credentials=True, expose_headers=["X-Has-More", "X-Next-Cursor", "ETag"])
+
+    # MySQL config
+    app.config['MYSQL_HOST'] = os.getenv("DB_HOST", "localhost")
+    app.config['MYSQL_USER'] = os.getenv("DB_USER", "root")
+    app.config['MYSQL_PASSWORD'] = os.getenv("DB_PASSWORD", "")
+    app.config['MYSQL_DB'] = os.getenv("DB_NAME", "ruri_club")
+    # utf8mb4 (SET NAMES) on every new pooled connection, so emojis won't break
+    app.config['MYSQL_CHARSET'] = 'utf8mb4'
+    app.config['MYSQL_POOL_SIZE'] = int(os.getenv("DB_POOL_SIZE", "10"))
+    app.config['MYSQL_POOL_TIMEOUT'] = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+    # cursors return tuples, as with flask_mysqldb
+    mysql.init_app(app)
+    app.config['CHAT_LOG_WRITE_BEHIND'] = os.getenv("CHAT_LOG_WRITE_BEHIND", "0") == "1"
+    app.config['CHAT_LOG_MAX_BATCH'] = int(os.getenv("CHAT_LOG_MAX_BATCH", "100"))
+    app.config['CHAT_LOG_FLUSH_MS'] = float(os.getenv("CHAT_LOG_FLUSH_MS", "200"))
+    # rows the writer had to drop (bad data) are also appended here as JSON lines
+    app.config['CHAT_LOG_DEAD_LETTER'] = os.getenv("CHAT_LOG_DEAD_LETTER", "")
+    # how long a request waits for room in a full write-behind queue (MySQL down) before a 503
+    app.config['CHAT_LOG_APPEND_TIMEOUT_MS'] = float(os.getenv("CHAT_LOG_APPEND_TIMEOUT_MS", "2000"))
+    chat_logs.init_app(app, mysql.pool)
+    app.config['PUBSUB_SOCKET'] = os.getenv("PUBSUB_SOCKET", "")
+    app.config['PUBSUB_AUTHKEY'] = os.getenv("PUBSUB_AUTHKEY", "")
+    events.init_app(app)
+    app.config['ADMIN_SUMMARY_REFRESH_SECONDS'] = float(os.getenv("ADMIN_SUMMARY_REFRESH_SECONDS", "30"))
+    summary.init_app(app, mysql.pool)
+    app.config['PRODUCTS_CACHE_TTL'] = float(os.getenv("PRODUCTS_CACHE_TTL", "60"))
+    catalog.init_app(app, mysql.pool)
+
+    app.register_blueprint(api)
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.get("request_started")
+        if started is not None:
+            HTTP_SECONDS.observe(time.perf_counter() - started, endpoint=request.endpoint or "unmatched",
+                                 method=request.method, status=response.status_code)
+        return response
+
+    # fallback AI model: preload = load right here (the gunicorn master, before fork);
+    # background = warm on a thread while rule + FAQ answers already work
+    if MODEL_LOAD in ("preload", "background"):
+        start_model_warmup()
+    return app
+
 
 # ------------------------
-# ensure DB connection uses utf8mb4 so emojis won't break
-# (run once inside app context)
+# helper: a user id from request JSON → int, or None when missing / not a number
+# (ids end up in chat_logs rows, which may be written later by the write-behind buffer)
 # ------------------------
-try:
-    with app.app_context():
-        cur = mysql.connection.cursor()
-        cur.execute("SET NAMES utf8mb4;")
-        cur.execute("SET CHARACTER SET utf8mb4;")
-        cur.execute("SET character_set_connection=utf8mb4;")
-        mysql.connection.commit()
-        cur.close()
-        print("✅ MySQL connection set to utf8mb4 (emoji-safe)")
-except Exception as e:
-    print("💥 MySQL encoding setup failed:", e)
+def parse_user_id(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
 
 
 # ------------------------
@@ -55,18 +157,235 @@ def row_to_dict(desc, row):
     return {desc[i][0]: row[i] for i in range(len(row))}
 
 
+# ------------------------
+# helper: store chat_logs rows (sender_id, receiver_id, message, chat_type), in order
+# - write-behind on: queued, written in batches by the background writer (response isn't delayed)
+# - off: one executemany + commit right here
+# - either way the conversations summary (inbox) is upserted in the same transaction, and the
+#   rows are pushed to /chat/events only after that commit, with their chat_id
+# - ChatLogBacklogFull: write-behind queue still full after CHAT_LOG_APPEND_TIMEOUT_MS (MySQL
+#   down); nothing was saved, routes answer chat_log_backlog_response()
+# ------------------------
+def save_chat_logs(*rows):
+    rows = [chat_log_row(*row) for row in rows]  # ValueError before anything is queued
+    if chat_logs.enabled:
+        chat_logs.append(*rows)  # published by the writer thread once committed (on_write below)
+    else:
+        cur = mysql.connection.cursor()
+        chat_ids = insert_chat_logs(cur, rows)
+        mysql.connection.commit()
+        cur.close()
+        publish_chat_logs(list(zip(chat_ids, rows)))
+
+
+def chat_log_backlog_response():
+    response = jsonify({"error": "Chat history is temporarily unavailable, please retry"})
+    response.status_code = 503
+    response.headers["Retry-After"] = "5"
+    return response
+
+
+# ------------------------
+# helper: push committed rows [(chat_id, row), ...] to open /chat/events streams
+# - topics: "conv:<conversation_key>" (both participants' chat window) and "user:<receiver_id>" (inbox)
+# - chat_id lets the client de-duplicate and resume history with ?after_id=
+# ------------------------
+def publish_chat_logs(written):
+    sent_at = time.strftime("%Y-%m-%d %H:%M:%S")
+    for chat_id, (sender_id, receiver_id, message, chat_type) in written:
+        try:
+            events.publish(
+                (f"conv:{conversation_key(sender_id, receiver_id)}", f"user:{receiver_id}"),
+                {"chat_id": chat_id, "sender_id": sender_id, "receiver_id": receiver_id, "message": message,
+                 "chat_type": chat_type, "sent_at": sent_at},
+            )
+        except Exception:
+            # the row is saved; a client that missed the push catches up from the history endpoint
+            log.exception("publish chat message failed")
+
+
+chat_logs.on_write(publish_chat_logs)
+
+
+# ------------------------
+# helper: log client -> AI message and AI -> client reply in chat_logs
+# ------------------------
+def save_ai_exchange(sender_id, message, response_text):
+    save_chat_logs(
+        (sender_id, 10, message, 'client_ai'),
+        (10, sender_id, response_text, 'client_ai'),
+    )
+
+
+# ------------------------
+# helper: one page of a conversation's chat_logs (keyset pagination on chat_id)
+# - conversation_key matches the generated column from migrations/001_chat_logs_conversation_key.sql
+# - ?limit=N (default 100, max 500) newest messages, ?before_id=X older page, ?after_id=X only newer ones
+# - rows come back oldest first; X-Has-More: 1 when another page exists in that direction
+# ------------------------
+HISTORY_DEFAULT_LIMIT = int(os.getenv("CHAT_HISTORY_DEFAULT_LIMIT", "100"))
+HISTORY_MAX_LIMIT = 500
+
+
+def conversation_key(user_a, user_b):
+    user_a, user_b = int(user_a), int(user_b)
+    return f"{min(user_a, user_b)}:{max(user_a, user_b)}"
+
+
+def conversation_page(user_a, user_b):
+    try:
+        limit = min(max(int(request.args.get('limit') or HISTORY_DEFAULT_LIMIT), 1), HISTORY_MAX_LIMIT)
+        before_id = int(request.args['before_id']) if request.args.get('before_id') else None
+        after_id = int(request.args['after_id']) if request.args.get('after_id') else None
+    except ValueError:
+        return jsonify({"error": "limit, before_id and after_id must be integers"}), 400
+
+    # read-your-writes: rows this worker still buffers are committed before the SELECT
+    chat_logs.flush(timeout=1.0)
+
+    sql = """
+        SELECT chat_id, sender_id, receiver_id, message, created_at, chat_type
+        FROM chat_logs
+        WHERE conversation_key = %s"""
+    args = [conversation_key(user_a, user_b)]
+    if before_id is not None:
+        sql += " AND chat_id < %s"
+        args.append(before_id)
+    if after_id is not None:
+        sql += " AND chat_id > %s"
+        args.append(after_id)
+    # polling for newer messages walks forward from after_id; otherwise take the newest page
+    sql += " ORDER BY chat_id ASC LIMIT %s" if after_id is not None else " ORDER BY chat_id DESC LIMIT %s"
+    args.append(limit + 1)  # one extra row tells us whether there is another page
+
+    cur = mysql.connection.cursor()
+    cur.execute(sql, args)
+    rows = list(cur.fetchall())
+    cur.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if after_id is None:
+        rows.reverse()
+    chats = [{"chat_id": r[0], "sender_id": r[1], "receiver_id": r[2], "message": r[3], "created_at": str(r[4]),
+              "chat_type": r[5]} for r in rows]
+    response = jsonify(chats)
+    response.headers['X-Has-More'] = '1' if has_more else '0'
+    return response
+
+
+# ------------------------
+# helper: format one Server-Sent Events frame
+# ------------------------
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+# ------------------------
+# helper: SSE stream of pushed chat messages for the given topics
+# - ": keepalive" comments every EVENTS_KEEPALIVE_SECONDS keep proxies from closing an idle stream
+# - the stream ends after EVENTS_MAX_SECONDS; EventSource reconnects on its own and the client
+#   fetches ?after_id=<last chat_id> once to fill any gap, also after a "resync" event (it fell
+#   behind and messages were dropped)
+# - production serves these URLs from events_server.py (one asyncio process, a coroutine per
+#   stream, fed by the pubsub relay): the reverse proxy sends /chat/events/ there, so streams
+#   never reach gunicorn. This in-worker version is for the dev server and single-process
+#   setups without the relay; each of its streams holds a thread for its whole life, so a
+#   worker still only serves EVENTS_MAX_STREAMS of them (default: half its threads) and answers
+#   503 + Retry-After past that, which keeps a misrouted deployment answering chat requests
+# - no DB access here: an open stream costs MySQL nothing
+# ------------------------
+EVENTS_KEEPALIVE_SECONDS = float(os.getenv("EVENTS_KEEPALIVE_SECONDS", "15"))
+EVENTS_MAX_SECONDS = float(os.getenv("EVENTS_MAX_SECONDS", "300"))
+EVENTS_MAX_STREAMS = int(os.getenv("EVENTS_MAX_STREAMS", str(max(1, int(os.getenv("GUNICORN_THREADS", "4")) // 2))))
+EVENTS_RETRY_AFTER_SECONDS = int(os.getenv("EVENTS_RETRY_AFTER_SECONDS", "30"))
+event_stream_slots = threading.BoundedSemaphore(EVENTS_MAX_STREAMS)
+EVENT_STREAMS_REJECTED = REGISTRY.counter("ruric_event_streams_rejected",
+                                          "/chat/events requests refused because EVENTS_MAX_STREAMS were open")
+
+
+def event_stream(*topics):
+    if not event_stream_slots.acquire(blocking=False):
+        EVENT_STREAMS_REJECTED.inc()
+        response = jsonify({"error": "too many open event streams; poll the history endpoint instead"})
+        response.status_code = 503
+        response.headers["Retry-After"] = str(EVENTS_RETRY_AFTER_SECONDS)
+        return response
+    try:
+        sub = events.subscribe(*topics)
+    except Exception:
+        event_stream_slots.release()
+        raise
+
+    def generate():
+        with sub:
+            yield "retry: 2000\n\n"
+            closes_at = time.monotonic() + EVENTS_MAX_SECONDS
+            while time.monotonic() < closes_at:
+                item = sub.get(min(EVENTS_KEEPALIVE_SECONDS, max(0.0, closes_at - time.monotonic())))
+                if sub.lagged:
+                    sub.lagged = False
+                    yield sse_event("resync", {})
+                if item is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield sse_event("message", item[1])
+
+    response = Response(generate(), mimetype='text/event-stream',
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # the server closes the response even if the client left before the first byte
+    response.call_on_close(sub.close)
+    response.call_on_close(event_stream_slots.release)
+    return response
+
+
 # ------------------------
 # Root
 # ------------------------
-@app.route('/')
+@api.route('/')
 def home():
     return jsonify({"message": "✅ Ruri backend running"})
 
 
+# ------------------------
+# Readiness: which chatbot stages are live (model may still be warming up)
+# ------------------------
+@api.route('/health/ready', methods=['GET'])
+def health_ready():
+    stages = readiness()
+    status = "ready" if stages["model"] == "ready" else "warming" if stages["model"] == "loading" else "degraded"
+    return jsonify({"status": status, "stages": stages}), 200
+
+
+# ------------------------
+# Prometheus metrics of this worker: per-stage chatbot timings, HTTP + DB latency
+# ------------------------
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+# ------------------------
+# DB connection pool of this worker: in use / idle, saturation, waits
+# ------------------------
+@api.route('/health/db', methods=['GET'])
+def health_db():
+    return jsonify(mysql.pool.stats()), 200
+
+
+# ------------------------
+# Memory of the worker serving this request: with --preload the model should show up
+# under shared_mb (paid once in the master), not unique_mb (paid per worker)
+# ------------------------
+@api.route('/health/memory', methods=['GET'])
+def health_memory():
+    return jsonify(worker_report()), 200
+
+
 # ------------------------
 # SIGNUP
 # ------------------------
-@app.route('/signup', methods=['OPTIONS', 'POST'])
+@api.route('/signup', methods=['OPTIONS', 'POST'])
 def signup():
     if request.method == 'OPTIONS':
         return jsonify({"message": "ok"}), 200
@@ -95,18 +414,19 @@ def signup():
         )
         mysql.connection.commit()
         cur.close()
+        summary.add_user(role)
 
         return jsonify({"message": "Signup successful!"}), 201
 
-    except Exception as e:
-        print("💥 Signup error:", e)
+    except Exception:
+        log.exception("Signup error")
         return jsonify({"error": "Internal Server Error"}), 500
 
 
 # ------------------------
 # LOGIN
 # ------------------------
-@app.route('/login', methods=['POST'])
+@api.route('/login', methods=['POST'])
 def login():
     try:
         data = request.json or {}
@@ -148,69 +468,88 @@ def login():
             "message": "Login successful"
         })
 
-    except Exception as e:
-        print("💥 Login error:", e)
+    except Exception:
+        log.exception("Login error")
         return jsonify({"error": "Internal Server Error"}), 500
 
 
 # ------------------------
 # CLIENT → AI chat (primary chat endpoint)
 # ------------------------
-@app.route('/chat', methods=['POST'])
+@api.route('/chat', methods=['POST'])
 def chat():
     try:
         data = request.json or {}
-        sender_id = data.get('sender_id')
+        sender_id = parse_user_id(data.get('sender_id'))
         message = (data.get('message') or "").strip()
 
         if not sender_id or message == "":
             return jsonify({"error": "sender_id and message required"}), 400
 
-        # Decide AI response (from nlp_model)
-        response_text = nlp_model_respond(message)
-        human_needed = False
-
-        lower = message.lower()
-        client_help_triggers = ["help", "support", "i need help", "human", "agent", "representative"]
-        if any(t in lower for t in client_help_triggers):
-            human_needed = True
-            response_text = "Don't worry — I will connect you to a live agent now."
-
-        # If AI's response suggests human, mark human_needed
-        if isinstance(response_text, str) and ("speak with a live support" in response_text.lower() or "connect you to a live" in response_text.lower()):
-            human_needed = True
+        # Decide AI response + whether a live agent is needed (one pass through the intent router)
+        result = nlp_model_route(message, sender_id=sender_id)
+        response_text = result.reply
+        human_needed = result.human_needed
 
         # Save client -> AI message and AI -> client response in chat_logs
-        cur = mysql.connection.cursor()
-        cur.execute(
-            "INSERT INTO chat_logs (sender_id, receiver_id, message, chat_type) VALUES (%s,%s,%s,%s)",
-            (sender_id, 10, message, 'client_ai')
-        )
-        cur.execute(
-            "INSERT INTO chat_logs (sender_id, receiver_id, message, chat_type) VALUES (%s,%s,%s,%s)",
-            (10, sender_id, response_text, 'client_ai')
-        )
-        mysql.connection.commit()
-        cur.close()
+        save_ai_exchange(sender_id, message, response_text)
 
-        return jsonify({"response": response_text, "human_needed": human_needed})
+        return jsonify({"response": response_text, "human_needed": human_needed, "intent": result.intent,
+                        "generation": result.generation})
 
-    except Exception as e:
-        print("💥 Chat error:", e)
+    except ChatLogBacklogFull:
+        log.warning("chat_logs backlog full; /chat answered 503")
+        return chat_log_backlog_response()
+    except Exception:
+        log.exception("Chat error")
         return jsonify({"error": "Internal Server Error"}), 500
 
 
+# ------------------------
+# CLIENT → AI chat, streamed as Server-Sent Events
+# - event "token": {"text": ...} (rule / FAQ answers arrive as a single token event)
+# - event "done":  {"response", "human_needed", "intent", "generation"} once the reply is complete + logged
+# ------------------------
+@api.route('/chat/stream', methods=['GET', 'POST'])
+def chat_stream():
+    data = (request.json or {}) if request.method == 'POST' else request.args
+    sender_id = parse_user_id(data.get('sender_id'))
+    message = (data.get('message') or "").strip()
+
+    if not sender_id or message == "":
+        return jsonify({"error": "sender_id and message required"}), 400
+
+    def generate():
+        try:
+            stream = nlp_model_stream(message, sender_id=sender_id)
+            for chunk in stream:
+                yield sse_event("token", {"text": chunk})
+            result = stream.result
+            save_ai_exchange(sender_id, message, result.reply)
+            yield sse_event("done", {"response": result.reply, "human_needed": result.human_needed,
+                                     "intent": result.intent, "generation": result.generation})
+        except ChatLogBacklogFull:
+            log.warning("chat_logs backlog full; /chat/stream ended with an error event")
+            yield sse_event("error", {"error": "Chat history is temporarily unavailable, please retry"})
+        except Exception:
+            log.exception("Chat stream error")
+            yield sse_event("error", {"error": "Internal Server Error"})
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 # ------------------------
 # Client asks to connect to a human (assign employee)
 # - picks from allowed employee user_ids (so you control which employees are used)
 # - stores/updates client_assignments table
 # - returns assigned employee id and name
 # ------------------------
-@app.route('/chat/request-human', methods=['POST'])
+@api.route('/chat/request-human', methods=['POST'])
 def request_human_support():
     try:
         data = request.json or {}
-        client_id = data.get('user_id')
+        client_id = parse_user_id(data.get('user_id'))
         if not client_id:
             return jsonify({"error": "user_id required"}), 400
 
@@ -239,28 +578,47 @@ def request_human_support():
             ON DUPLICATE KEY UPDATE employee_id = VALUES(employee_id), assigned_at = CURRENT_TIMESTAMP
         """, (client_id, assigned_employee_id))
 
+        mysql.connection.commit()
+        cur.close()
+
         # Add a short system trace log for transparency
         sys_msg = f"System: client {client_id} assigned to employee {assigned_employee_name} (id {assigned_employee_id})"
-        cur.execute(
-            "INSERT INTO chat_logs (sender_id, receiver_id, message, chat_type) VALUES (%s,%s,%s,%s)",
-            (3, client_id, sys_msg, 'system')
-        )
+        try:
+            save_chat_logs((3, client_id, sys_msg, 'system'))
+        except ChatLogBacklogFull:
+            # the assignment is committed; the trace note is only for transparency
+            log.warning("chat_logs backlog full; assignment note for client %s not logged", client_id)
 
-        mysql.connection.commit()
-        cur.close()
+        # the live agent takes over: the AI's multi-turn context for this client is no longer needed
+        reset_conversation(client_id)
 
-        print(f"✅ Assigned employee {assigned_employee_id} ({assigned_employee_name}) to client {client_id}")
+        log.info("Assigned employee %s (%s) to client %s", assigned_employee_id, assigned_employee_name, client_id)
         return jsonify({"assigned_employee": assigned_employee_id, "assigned_name": assigned_employee_name})
 
     except Exception as e:
-        print("💥 Human support error:", e)
+        log.exception("Human support error")
         return jsonify({"error": str(e)}), 500
 
 
+# ------------------------
+# Push channel (replaces polling the history endpoints)
+# - /chat/events/<user_id>/<peer_id>: new messages in one conversation (either direction)
+# - /chat/events/<user_id>: every new message sent to this user (e.g. employee inbox)
+# ------------------------
+@api.route('/chat/events/<int:user_id>/<int:peer_id>', methods=['GET'])
+def conversation_events(user_id, peer_id):
+    return event_stream(f"conv:{conversation_key(user_id, peer_id)}")
+
+
+@api.route('/chat/events/<int:user_id>', methods=['GET'])
+def user_events(user_id):
+    return event_stream(f"user:{user_id}")
+
+
 # ------------------------
 # Fetch assignment for client
 # ------------------------
-@app.route('/assignment/<int:client_id>', methods=['GET'])
+@api.route('/assignment/<int:client_id>', methods=['GET'])
 def get_assignment(client_id):
     try:
         cur = mysql.connection.cursor()
@@ -279,8 +637,8 @@ def get_assignment(client_id):
             return jsonify({"employee_name": result[0], "employee_id": result[1]}), 200
         else:
             return jsonify({"error": "No assignment found"}), 404
-    except Exception as e:
-        print("💥 Error fetching assignment:", e)
+    except Exception:
+        log.exception("Error fetching assignment")
         return jsonify({"error": "Internal Server Error"}), 500
 
 
@@ -288,44 +646,36 @@ def get_assignment(client_id):
 # Client -> Employee message endpoint (client sends message to assigned employee)
 # - frontend ChatBox calls this when assignedEmployee exists
 # ------------------------
-@app.route('/chat/client/send', methods=['POST'])
+@api.route('/chat/client/send', methods=['POST'])
 def client_send_message():
     try:
         data = request.json or {}
-        employee_id = data.get('employee_id')
-        client_id = data.get('client_id')
+        employee_id = parse_user_id(data.get('employee_id'))
+        client_id = parse_user_id(data.get('client_id'))
         message = data.get('message')
 
         if not all([employee_id, client_id, message]):
             return jsonify({"error": "employee_id, client_id and message required"}), 400
 
-        cur = mysql.connection.cursor()
-        # log client -> employee
-        cur.execute(
-            "INSERT INTO chat_logs (sender_id, receiver_id, message, chat_type) VALUES (%s,%s,%s,%s)",
-            (client_id, employee_id, message, 'client_employee')
-        )
-
-        # optionally add system note for employee inbox visibility (not required)
+        # log client -> employee, plus a system note for employee inbox visibility (not required)
         sys_msg = f"System: Client {client_id} sent a message to you."
-        cur.execute(
-            "INSERT INTO chat_logs (sender_id, receiver_id, message, chat_type) VALUES (%s,%s,%s,%s)",
-            (client_id, employee_id, sys_msg, 'client_employee')
+        save_chat_logs(
+            (client_id, employee_id, message, 'client_employee'),
+            (client_id, employee_id, sys_msg, 'client_employee'),
         )
 
-        mysql.connection.commit()
-        cur.close()
-
         return jsonify({"status": "Message delivered to employee inbox"}), 201
-    except Exception as e:
-        print("💥 client_send_message error:", e)
+    except ChatLogBacklogFull:
+        return chat_log_backlog_response()
+    except Exception:
+        log.exception("client_send_message error")
         return jsonify({"error": "Internal Server Error"}), 500
 
 
 # ------------------------
 # Employee endpoints
 # ------------------------
-@app.route('/employee/<int:employee_id>/assignments', methods=['GET'])
+@api.route('/employee/<int:employee_id>/assignments', methods=['GET'])
 def get_employee_assignments(employee_id):
     try:
         cur = mysql.connection.cursor()
@@ -340,60 +690,109 @@ def get_employee_assignments(employee_id):
         clients = [{"user_id": r[0], "full_name": r[1], "assigned_at": str(r[2])} for r in rows]
         cur.close()
         return jsonify(clients)
-    except Exception as e:
-        print("💥 get_employee_assignments error:", e)
+    except Exception:
+        log.exception("get_employee_assignments error")
         return jsonify({"error": "Internal Server Error"}), 500
 
 
-@app.route('/chat/employee/<int:employee_id>/client/<int:client_id>', methods=['GET'])
-def employee_get_chat_history(employee_id, client_id):
+# ------------------------
+# Employee inbox: every assigned client with last message, last activity and unread count,
+# from the conversations summary table (migrations/002) in one query — no per-client history calls
+# ------------------------
+@api.route('/employee/<int:employee_id>/inbox', methods=['GET'])
+def get_employee_inbox(employee_id):
     try:
+        chat_logs.flush(1.0)  # include rows still in the write-behind buffer
         cur = mysql.connection.cursor()
         cur.execute("""
-            SELECT sender_id, receiver_id, message, created_at, chat_type
-            FROM chat_logs
-            WHERE (sender_id=%s AND receiver_id=%s)
-               OR (sender_id=%s AND receiver_id=%s)
-            ORDER BY created_at ASC
-        """, (client_id, employee_id, employee_id, client_id))
+            SELECT a.client_id, u.full_name, a.assigned_at, c.last_message, c.last_sender_id,
+                   c.last_chat_type, c.last_activity_at,
+                   CASE WHEN c.user_low = a.employee_id THEN c.unread_low ELSE c.unread_high END
+            FROM client_assignments a
+            JOIN users u ON a.client_id = u.user_id
+            LEFT JOIN conversations c ON c.conversation_key =
+                CONCAT(LEAST(a.client_id, a.employee_id), ':', GREATEST(a.client_id, a.employee_id))
+            WHERE a.employee_id = %s
+            ORDER BY COALESCE(c.last_activity_at, a.assigned_at) DESC
+        """, (employee_id,))
         rows = cur.fetchall()
         cur.close()
-        chats = [{"sender_id": r[0], "receiver_id": r[1], "message": r[2], "created_at": str(r[3]), "chat_type": r[4]} for r in rows]
-        return jsonify(chats)
-    except Exception as e:
-        print("💥 employee_get_chat_history error:", e)
+        return jsonify([{
+            "user_id": r[0],
+            "full_name": r[1],
+            "assigned_at": str(r[2]),
+            "last_message": r[3],
+            "last_sender_id": r[4],
+            "last_chat_type": r[5],
+            "last_activity_at": str(r[6]) if r[6] else None,
+            "unread": r[7] or 0
+        } for r in rows])
+    except Exception:
+        log.exception("get_employee_inbox error")
         return jsonify({"error": "Internal Server Error"}), 500
 
 
-@app.route('/chat/employee/reply', methods=['POST'])
+# ------------------------
+# Mark a conversation read for one participant (resets their unread count)
+# ------------------------
+@api.route('/chat/read', methods=['POST'])
+def mark_conversation_read():
+    try:
+        data = request.json or {}
+        reader_id = parse_user_id(data.get('user_id'))
+        peer_id = parse_user_id(data.get('peer_id'))
+        if not reader_id or not peer_id:
+            return jsonify({"error": "user_id and peer_id required"}), 400
+
+        chat_logs.flush(1.0)  # count messages still in the write-behind buffer as read too
+        cur = mysql.connection.cursor()
+        cur.execute("""
+            UPDATE conversations
+            SET unread_low = IF(user_low = %s, 0, unread_low), unread_high = IF(user_high = %s, 0, unread_high)
+            WHERE conversation_key = %s
+        """, (reader_id, reader_id, conversation_key(reader_id, peer_id)))
+        mysql.connection.commit()
+        cur.close()
+        return jsonify({"status": "read"})
+    except Exception:
+        log.exception("mark_conversation_read error")
+        return jsonify({"error": "Internal Server Error"}), 500
+
+
+@api.route('/chat/employee/<int:employee_id>/client/<int:client_id>', methods=['GET'])
+def employee_get_chat_history(employee_id, client_id):
+    try:
+        return conversation_page(client_id, employee_id)
+    except Exception:
+        log.exception("employee_get_chat_history error")
+        return jsonify({"error": "Internal Server Error"}), 500
+
+
+@api.route('/chat/employee/reply', methods=['POST'])
 def employee_reply():
     try:
         data = request.json or {}
-        employee_id = data.get('employee_id')
-        client_id = data.get('client_id')
+        employee_id = parse_user_id(data.get('employee_id'))
+        client_id = parse_user_id(data.get('client_id'))
         message = data.get('message')
 
         if not all([employee_id, client_id, message]):
             return jsonify({"error": "employee_id, client_id and message required"}), 400
 
-        cur = mysql.connection.cursor()
-        cur.execute(
-            "INSERT INTO chat_logs (sender_id, receiver_id, message, chat_type) VALUES (%s,%s,%s,%s)",
-            (employee_id, client_id, message, 'employee_client')
-        )
-        mysql.connection.commit()
-        cur.close()
+        save_chat_logs((employee_id, client_id, message, 'employee_client'))
         return jsonify({"status": "Message sent to client"}), 201
 
-    except Exception as e:
-        print("💥 employee_reply error:", e)
+    except ChatLogBacklogFull:
+        return chat_log_backlog_response()
+    except Exception:
+        log.exception("employee_reply error")
         return jsonify({"error": "Internal Server Error"}), 500
 
 
 # ------------------------
 # ATTENDANCE
 # ------------------------
-@app.route('/attendance/mark', methods=['POST'])
+@api.route('/attendance/mark', methods=['POST'])
 def mark_attendance():
     try:
         data = request.json or {}
@@ -406,13 +805,15 @@ def mark_attendance():
         cur.execute("INSERT INTO attendance (employee_id, status, date) VALUES (%s,%s,CURDATE())", (employee_id, status))
         mysql.connection.commit()
         cur.close()
+        if status == 'Present':
+            summary.add("present_today")
         return jsonify({"message": f"Attendance marked as {status} for today."}), 201
-    except Exception as e:
-        print("💥 mark_attendance error:", e)
+    except Exception:
+        log.exception("mark_attendance error")
         return jsonify({"error": "Internal Server Error"}), 500
 
 
-@app.route('/attendance/<int:employee_id>', methods=['GET'])
+@api.route('/attendance/<int:employee_id>', methods=['GET'])
 def get_attendance_records(employee_id):
     try:
         cur = mysql.connection.cursor()
@@ -433,34 +834,25 @@ def get_attendance_records(employee_id):
             "status": r[5]
         } for r in rows]
         return jsonify(result)
-    except Exception as e:
-        print("💥 get_attendance_records error:", e)
+    except Exception:
+        log.exception("get_attendance_records error")
         return jsonify({"error": "Internal Server Error"}), 500
 
 
 # ------------------------
 # ADMIN helper routes (summary, employees, chat)
 # ------------------------
-@app.route('/admin/summary', methods=['GET'])
+@api.route('/admin/summary', methods=['GET'])
 def admin_summary():
+    # served from memory (summary_counters.py); as_of = when the counts were last recounted
     try:
-        cur = mysql.connection.cursor()
-        cur.execute("SELECT COUNT(*) FROM users WHERE role='employee'")
-        employees = cur.fetchone()[0]
-        cur.execute("SELECT COUNT(*) FROM users WHERE role='client'")
-        clients = cur.fetchone()[0]
-        cur.execute("SELECT COUNT(*) FROM orders")
-        orders = cur.fetchone()[0]
-        cur.execute("SELECT COUNT(*) FROM attendance WHERE date = CURDATE() AND status = 'Present'")
-        present_today = cur.fetchone()[0]
-        cur.close()
-        return jsonify({"employees": employees, "clients": clients, "orders": orders, "present_today": present_today})
-    except Exception as e:
-        print("💥 admin_summary error:", e)
+        return jsonify(summary.get())
+    except Exception:
+        log.exception("admin_summary error")
         return jsonify({"error": "Internal Server Error"}), 500
 
 
-@app.route('/admin/employees', methods=['GET'])
+@api.route('/admin/employees', methods=['GET'])
 def admin_get_employees():
     try:
         cur = mysql.connection.cursor()
@@ -468,52 +860,40 @@ def admin_get_employees():
         rows = cur.fetchall()
         cur.close()
         return jsonify([{"user_id": r[0], "full_name": r[1], "email": r[2]} for r in rows])
-    except Exception as e:
-        print("💥 admin_get_employees error:", e)
+    except Exception:
+        log.exception("admin_get_employees error")
         return jsonify({"error": "Internal Server Error"}), 500
 
 
-@app.route('/admin/chat/<int:employee_id>', methods=['GET'])
+@api.route('/admin/chat/<int:employee_id>', methods=['GET'])
 def admin_get_chat_history(employee_id):
     try:
         admin_id = 3
-        cur = mysql.connection.cursor()
-        cur.execute("""
-            SELECT sender_id, receiver_id, message, created_at, chat_type
-            FROM chat_logs
-            WHERE (sender_id = %s AND receiver_id = %s)
-               OR (sender_id = %s AND receiver_id = %s)
-            ORDER BY created_at ASC
-        """, (employee_id, admin_id, admin_id, employee_id))
-        rows = cur.fetchall()
-        cur.close()
-        return jsonify([{"sender_id": r[0], "receiver_id": r[1], "message": r[2], "created_at": str(r[3]), "chat_type": r[4]} for r in rows])
-    except Exception as e:
-        print("💥 admin_get_chat_history error:", e)
+        return conversation_page(employee_id, admin_id)
+    except Exception:
+        log.exception("admin_get_chat_history error")
         return jsonify({"error": "Internal Server Error"}), 500
 
 
-@app.route('/admin/chat/send', methods=['POST'])
+@api.route('/admin/chat/send', methods=['POST'])
 def admin_send_message():
     try:
         data = request.json or {}
         admin_id = 3
-        employee_id = data.get('employee_id')
+        employee_id = parse_user_id(data.get('employee_id'))
         message = data.get('message')
         if not employee_id or not message:
             return jsonify({"error": "Employee ID and message required"}), 400
-        cur = mysql.connection.cursor()
-        cur.execute("INSERT INTO chat_logs (sender_id, receiver_id, message, chat_type) VALUES (%s,%s,%s,%s)",
-                    (admin_id, employee_id, message, 'admin_employee'))
-        mysql.connection.commit()
-        cur.close()
+        save_chat_logs((admin_id, employee_id, message, 'admin_employee'))
         return jsonify({"message": "Message sent successfully"}), 201
-    except Exception as e:
-        print("💥 admin_send_message error:", e)
+    except ChatLogBacklogFull:
+        return chat_log_backlog_response()
+    except Exception:
+        log.exception("admin_send_message error")
         return jsonify({"error": "Internal Server Error"}), 500
 
 
-@app.route('/admin/employee_ratings', methods=['GET'])
+@api.route('/admin/employee_ratings', methods=['GET'])
 def admin_employee_ratings():
     ratings = [
         {"employee": "Alice Reyes", "rating": 4.8, "reviews": 35},
@@ -526,33 +906,89 @@ def admin_employee_ratings():
 # ------------------------
 # images & products
 # ------------------------
-@app.route('/images/<path:filename>')
+@api.route('/images/<path:filename>')
 def serve_images(filename):
-    return send_from_directory(os.path.join(app.root_path, 'static', 'images'), filename)
+    return send_from_directory(os.path.join(current_app.root_path, 'static', 'images'), filename)
 
 
-@app.route('/products', methods=['GET'])
+# ------------------------
+# products catalog (product_catalog.py snapshot, no query per request)
+# - no parameters: the whole catalog, newest first (pre-serialized)
+# - ?limit=N&cursor=C pages (X-Next-Cursor header), ?min_price= ?max_price= ?in_stock=1 filter
+# - strong ETag per catalog version + parameters; If-None-Match → 304 while nothing changed
+# - at most PRODUCTS_CACHE_TTL seconds stale: products are edited outside the app
+# ------------------------
+PRODUCTS_MAX_LIMIT = 200
+
+
+@api.route('/products', methods=['GET'])
 def get_products():
     try:
-        cur = mysql.connection.cursor()
-        cur.execute("SELECT * FROM products ORDER BY created_at DESC")
-        products = [{
-            "product_id": r[0],
-            "name": r[1],
-            "description": r[2],
-            "price": str(r[3]),
-            "stock": r[4],
-            "image_url": r[5],
-            "created_at": str(r[6])
-        } for r in cur.fetchall()]
-        cur.close()
-        return jsonify(products)
-    except Exception as e:
-        print("💥 get_products error:", e)
+        snapshot = catalog.current()
+        args = request.args
+        etag = snapshot.version
+        if args:
+            params = "&".join(f"{k}={v}" for k, v in sorted(args.items(multi=True)))
+            etag += "-" + hashlib.sha1(params.encode("utf-8")).hexdigest()[:12]
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+
+        next_cursor = None
+        if not args:
+            body = snapshot.body
+        else:
+            try:
+                limit = min(max(int(args['limit']), 1), PRODUCTS_MAX_LIMIT) if args.get('limit') else None
+                products, next_cursor = snapshot.page(
+                    limit=limit,
+                    cursor=args.get('cursor'),
+                    min_price=parse_price(args.get('min_price')),
+                    max_price=parse_price(args.get('max_price')),
+                    in_stock=args.get('in_stock') in ('1', 'true'),
+                )
+            except ValueError:
+                return jsonify({"error": "limit, cursor, min_price and max_price must be valid values"}), 400
+            body = json.dumps(products)
+
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'  # always revalidate; unchanged → 304
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
+    except Exception:
+        log.exception("get_products error")
+        return jsonify({"error": "Internal Server Error"}), 500
+
+
+# ------------------------
+# product search (type-ahead): ?q=words&limit=N (default 20, max 100)
+# - every word must match a name / description word or the start of one (type-ahead)
+# - ranked best first; answered from product_search.py's in-memory index, no MySQL
+# ------------------------
+@api.route('/products/search', methods=['GET'])
+def search_products():
+    try:
+        query = (request.args.get('q') or "").strip()
+        try:
+            limit = min(max(int(request.args.get('limit') or 20), 1), 100)
+        except ValueError:
+            return jsonify({"error": "limit must be a number"}), 400
+        catalog.current()  # first load / TTL revalidation feeds the index through on_reload
+        results = product_search.search(query, limit) if query else []
+        return jsonify([dict(product, score=score) for score, product in results])
+    except Exception:
+        log.exception("search_products error")
         return jsonify({"error": "Internal Server Error"}), 500
 
 
 # ------------------------
+# module-level app for `gunicorn app:app` / `gunicorn -c gunicorn.conf.py` and `python app.py`
+# ------------------------
+app = create_app()
+
 if __name__ == "__main__":
     # debug mode for local dev
     app.run(debug=True)
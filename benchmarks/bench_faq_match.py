@@ -0,0 +1,83 @@
+# benchmarks/bench_faq_match.py
+# FAQ matching cost vs. FAQ size: IntentRouter (intents.yaml + the FAQ questions in one Aho-Corasick
+# automaton, the production path) vs. the old linear `q in user_input` scan. Reports the router build
+# time (paid on every FAQ reload) and classify() time per message.
+#   python benchmarks/bench_faq_match.py [--sizes 50,1000,10000,100000] [--messages 200]
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from intent_router import IntentRouter, load_intent_table  # noqa: E402
+
+WORDS = (
+    "order delivery fee store hours branch payment gcash cancel refund track rice mango "
+    "banana eggs milk honey price stock discount voucher pickup courier address phone "
+    "email support weekend holiday open close fresh organic vegetables fruit bulk"
+).split()
+
+
+def synthetic_questions(n, rng):
+    questions = set()
+    while len(questions) < n:
+        k = rng.randint(3, 8)
+        questions.add(" ".join(rng.choice(WORDS) for _ in range(k)) + f" #{len(questions)}?")
+    return list(questions)
+
+
+def synthetic_messages(questions, n, rng):
+    messages = []
+    for i in range(n):
+        if i % 2:
+            # embeds a real question so both have to report it
+            messages.append("hi there, " + rng.choice(questions) + " thanks")
+        else:
+            messages.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 20))))
+    return messages
+
+
+def time_per_message(fn, messages, max_seconds=5.0):
+    start = time.perf_counter()
+    done = 0
+    for m in messages:
+        fn(m)
+        done += 1
+        if time.perf_counter() - start > max_seconds:
+            break
+    return (time.perf_counter() - start) / done * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="50,500,5000,50000,100000")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    table = load_intent_table(os.path.join(ROOT, "intents.yaml"))
+    rng = random.Random(args.seed)
+    print(f"{'faq rows':>10} {'build ms':>10} {'router us/msg':>15} {'linear us/msg':>15}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        questions = synthetic_questions(size, rng)
+        messages = synthetic_messages(questions, args.messages, rng)
+
+        t0 = time.perf_counter()
+        router = IntentRouter(table, {q: f"answer {i}" for i, q in enumerate(questions)})
+        build_ms = (time.perf_counter() - t0) * 1e3
+
+        def linear(msg):
+            for q in questions:
+                if q in msg:
+                    return q
+            return None
+
+        router_us = time_per_message(router.classify, messages)
+        linear_us = time_per_message(linear, messages)
+        print(f"{size:>10} {build_ms:>10.1f} {router_us:>15.1f} {linear_us:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+# benchmarks/bench_pipeline.py
+# End-to-end nlp_model_route benchmark on synthetic traffic (greetings, help requests, exact FAQ,
+# paraphrased FAQ, free text) while the FAQ sheet is scaled up synthetically. Reports latency
+# percentiles per stage and per message kind, throughput and the share of messages that reach
+# the model. The model is stubbed by default (fixed delay) so runs take seconds.
+#   python benchmarks/bench_pipeline.py [--sizes 10,1000,10000] [--messages 2000] [--json out.json]
+#   python benchmarks/bench_pipeline.py --model real      # actual DialoGPT (MODEL_NAME)
+#   python benchmarks/bench_pipeline.py --senders 0       # anonymous messages (no sender_id)
+# Like /chat and /chat/stream, every message carries a sender_id by default (--senders N users),
+# so follow-up fallbacks take the conversation path and skip the reply cache and batcher.
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("MODEL_LOAD", "off")         # the benchmark decides when/if to load
+os.environ.setdefault("FAQ_RELOAD_INTERVAL", "0")  # no hot reload swapping the synthetic FAQ out
+
+import nlp_model  # noqa: E402
+from faq_store import build_index  # noqa: E402
+from generation_budget import COMPLETE  # noqa: E402
+from intent_router import load_intent_table  # noqa: E402
+
+KINDS = ("greeting", "help", "faq_exact", "faq_paraphrase", "free_text")
+GREETINGS = ["hi", "hello", "hey", "good morning", "good afternoon"]
+HELP = ["i need help with my order", "can i talk to a human", "there is a problem with my payment",
+        "my app shows an error", "i'm stuck at checkout", "please get me an agent"]
+TOPICS = ("delivery fee refund voucher pickup courier gcash rice mango banana eggs milk honey "
+          "vegetables fruit bulk discount branch weekend holiday membership receipt").split()
+TEMPLATES = ["what is your {} {} policy?", "do you have {} for {}?", "how much is the {} {}?",
+             "can i pay for {} with {}?", "is {} available at the {} branch?", "when do you restock {} {}?"]
+QUALIFIERS = ["", " today", " this week", " on weekends", " for members", " in bulk", " online",
+              " near me", " during holidays", " for pickup", " for delivery"]
+FREE_WORDS = ("thanks ok sure maybe tomorrow weather nice cool today yesterday recommend breakfast "
+              "lunch dinner friend family price cheap fresh best season sweet").split()
+
+
+def synthetic_faq(n, rng):
+    """{question: answer} with `n` extra template questions."""
+    capacity = len(TEMPLATES) * len(TOPICS) ** 2 * len(QUALIFIERS)
+    if n > capacity:
+        raise SystemExit(f"at most {capacity} distinct synthetic questions")
+    out = {}
+    while len(out) < n:
+        q = rng.choice(TEMPLATES).format(rng.choice(TOPICS), rng.choice(TOPICS))
+        q = q[:-1] + rng.choice(QUALIFIERS) + "?"
+        out.setdefault(q, f"Synthetic answer #{len(out)}")
+    return out
+
+
+def paraphrase(question, rng):
+    # drop one word and misspell another: misses the exact / substring matchers on purpose
+    words = question.rstrip("?").split()
+    if len(words) > 3:
+        del words[rng.randrange(len(words))]
+    i = rng.randrange(len(words))
+    if len(words[i]) > 4:
+        j = rng.randrange(1, len(words[i]) - 1)
+        words[i] = words[i][:j] + words[i][j + 1:]
+    return " ".join(words)
+
+
+def corpus(questions, n, mix, rng):
+    messages = []
+    for _ in range(n):
+        kind = rng.choices(KINDS, weights=mix)[0]
+        if kind == "greeting":
+            text = rng.choice(GREETINGS)
+        elif kind == "help":
+            text = rng.choice(HELP)
+        elif kind == "faq_exact":
+            text = rng.choice(questions)
+        elif kind == "faq_paraphrase":
+            text = paraphrase(rng.choice(questions), rng)
+        else:
+            text = " ".join(rng.choice(FREE_WORDS) for _ in range(rng.randint(3, 9)))
+        messages.append((kind, text))
+    return messages
+
+
+class StageClock:
+    """Wraps callables so each call's wall time is charged to a named stage of the current message."""
+
+    def __init__(self):
+        self.current = defaultdict(float)
+
+    def wrap(self, stage, fn):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.current[stage] += time.perf_counter() - started
+        return timed
+
+    def instrument(self, index):
+        index.router.route = self.wrap("router", index.router.route)
+        index.fuzzy.lookup = self.wrap("fuzzy", index.fuzzy.lookup)
+        index.fuzzy.correct = self.wrap("fuzzy", index.fuzzy.correct)
+        index.retriever.best = self.wrap("semantic", index.retriever.best)
+        return index
+
+    def take(self):
+        out, self.current = dict(self.current), defaultdict(float)
+        return out
+
+
+def percentiles(samples_ms):
+    if not samples_ms:
+        return None
+    s = sorted(samples_ms)
+    pick = lambda p: s[min(len(s) - 1, int(p / 100.0 * len(s)))]  # noqa: E731
+    return {"n": len(s), "p50": round(pick(50), 3), "p90": round(pick(90), 3), "p99": round(pick(99), 3),
+            "max": round(s[-1], 3), "mean": round(sum(s) / len(s), 3)}
+
+
+def run_size(base, size, args, clock, rng):
+    responses = {**base, **synthetic_faq(size, rng)}
+    started = time.perf_counter()
+    index = build_index(responses, load_intent_table(nlp_model.INTENTS_PATH), source="synthetic")
+    build_ms = (time.perf_counter() - started) * 1e3
+    nlp_model.FAQ_STORE.swap(clock.instrument(index))  # also clears the fallback cache
+
+    messages = corpus(list(responses), args.messages, [float(w) for w in args.mix.split(",")], rng)
+    by_stage, by_kind, outcomes = defaultdict(list), defaultdict(list), defaultdict(lambda: defaultdict(int))
+    model_calls = 0
+    run_started = time.perf_counter()
+    for kind, text in messages:
+        t0 = time.perf_counter()
+        sender_id = rng.randrange(args.senders) if args.senders else None
+        result = nlp_model.nlp_model_route(text, sender_id=sender_id)
+        total_ms = (time.perf_counter() - t0) * 1e3
+        stages = clock.take()
+        model_calls += "model" in stages
+        for stage, seconds in stages.items():
+            by_stage[stage].append(seconds * 1e3)
+        by_stage["total"].append(total_ms)
+        by_kind[kind].append(total_ms)
+        outcomes[kind][result.intent if result.generation is None else f"{result.intent}:{result.generation}"] += 1
+    wall = time.perf_counter() - run_started
+
+    return {
+        "faq_rows": len(responses),
+        "index_build_ms": round(build_ms, 1),
+        "messages": len(messages),
+        "throughput_msg_s": round(len(messages) / wall, 1),
+        "model_fraction": round(model_calls / len(messages), 4),
+        "latency_ms": {"stage": {k: percentiles(v) for k, v in sorted(by_stage.items())},
+                       "kind": {k: percentiles(by_kind[k]) for k in KINDS if by_kind[k]}},
+        "outcomes": {k: dict(v) for k, v in outcomes.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10,1000,10000", help="synthetic FAQ rows added to the real sheet")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--mix", default="1,1,2,2,2", help="weights for " + ",".join(KINDS))
+    parser.add_argument("--model", choices=("stub", "real"), default="stub")
+    parser.add_argument("--stub-ms", type=float, default=50.0, help="stub model latency per generation")
+    parser.add_argument("--senders", type=int, default=50, help="distinct sender_ids (0 = no sender_id)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON ('-' = stdout only)")
+    args = parser.parse_args()
+
+    clock = StageClock()
+    if args.model == "stub":
+        talked = set()  # senders with a stored conversation, as CONVERSATIONS would have them
+
+        def stub_generate(prompt, max_new_tokens, deadline, sender_id=None):
+            time.sleep(args.stub_ms / 1000.0)
+            if sender_id is not None:
+                talked.add(sender_id)
+            return f"stub reply to {prompt[:20]}", COMPLETE
+        nlp_model._model_available = lambda: True
+        nlp_model.has_context = lambda sender_id: sender_id in talked
+        nlp_model.remember_turn = lambda sender_id, prompt, reply: talked.add(sender_id) if sender_id is not None else None
+        nlp_model.generate_reply = clock.wrap("model", stub_generate)
+    else:
+        if not nlp_model.load_model():
+            raise SystemExit(f"model failed to load: {nlp_model.MODEL_STATE['error']}")
+        nlp_model.generate_reply = clock.wrap("model", nlp_model.generate_reply)
+
+    rng = random.Random(args.seed)
+    base = dict(nlp_model.faq_index().responses)  # the real sheet, before any synthetic swap
+    report = {
+        "benchmark": "pipeline",
+        "config": {"model": args.model if args.model == "stub" else nlp_model.MODEL_NAME,
+                   "stub_ms": args.stub_ms if args.model == "stub" else None,
+                   "messages": args.messages, "senders": args.senders, "mix": dict(zip(KINDS, map(float, args.mix.split(",")))), "seed": args.seed,
+                   "fuzzy_distance": nlp_model.FAQ_FUZZY_DISTANCE,
+                   "similarity_threshold": nlp_model.FAQ_SIMILARITY_THRESHOLD},
+        "python": platform.python_version(),
+        "results": [run_size(base, int(s), args, clock, rng) for s in args.sizes.split(",")],
+    }
+
+    if args.json == "-":
+        print(json.dumps(report, indent=2))
+        return
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print(f"model: {report['config']['model']}  messages/size: {args.messages}  senders: {args.senders or 'none'}")
+    print(f"{'faq rows':>9} {'build ms':>9} {'msg/s':>8} {'model %':>8} {'p50 ms':>8} {'p99 ms':>8}"
+          f" {'router p99':>11} {'fuzzy p99':>10} {'semantic p99':>13}")
+    for r in report["results"]:
+        st = r["latency_ms"]["stage"]
+        p99 = lambda k: f"{st[k]['p99']:.3f}" if st.get(k) else "-"  # noqa: E731
+        print(f"{r['faq_rows']:>9} {r['index_build_ms']:>9.1f} {r['throughput_msg_s']:>8.1f}"
+              f" {r['model_fraction']:>8.1%} {st['total']['p50']:>8.3f} {st['total']['p99']:>8.3f}"
+              f" {p99('router'):>11} {p99('fuzzy'):>10} {p99('semantic'):>13}")
+
+
+if __name__ == "__main__":
+    main()
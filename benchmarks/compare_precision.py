@@ -0,0 +1,132 @@
+# benchmarks/compare_precision.py
+# fp32 vs int8 (dynamic quantization) for the DialoGPT fallback: latency, memory, reply agreement.
+#   python benchmarks/compare_precision.py [--model microsoft/DialoGPT-small] [--max-new-tokens 40]
+import argparse
+import copy
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import torch  # noqa: E402
+from transformers import AutoModelForCausalLM, AutoTokenizer  # noqa: E402
+
+from nlp_model import quantize_int8  # noqa: E402
+
+# fixed prompts that typically reach the fallback (no rule / FAQ hit)
+PROMPTS = [
+    "thanks",
+    "ok",
+    "how much",
+    "do you sell mangoes?",
+    "is the rice fresh today",
+    "what do you recommend for breakfast",
+    "can i get a discount if i buy in bulk",
+    "are your vegetables organic",
+    "my order has not arrived yet",
+    "what is the best fruit this season",
+    "good evening",
+    "how are you",
+]
+
+
+def rss_mb():
+    # resident set size of this process, Linux only
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return float("nan")
+
+
+def weights_mb(mdl):
+    buf = io.BytesIO()
+    torch.save(mdl.state_dict(), buf)
+    return buf.tell() / (1024.0 * 1024.0)
+
+
+def run(mdl, tok, prompts, max_new_tokens):
+    replies, tokens, seconds = [], 0, 0.0
+    with torch.no_grad():
+        for prompt in prompts:
+            ids = tok.encode(prompt + tok.eos_token, return_tensors="pt")
+            started = time.perf_counter()
+            out = mdl.generate(ids, max_new_tokens=max_new_tokens, do_sample=False,
+                               pad_token_id=tok.eos_token_id)
+            seconds += time.perf_counter() - started
+            new = out[0, ids.shape[-1]:]
+            tokens += int(new.shape[-1])
+            replies.append((new.tolist(), tok.decode(new, skip_special_tokens=True).strip()))
+    return replies, tokens, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=os.getenv("MODEL_NAME", "microsoft/DialoGPT-small"))
+    parser.add_argument("--max-new-tokens", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    tok = AutoTokenizer.from_pretrained(args.model)
+    rss_before = rss_mb()
+    fp32 = AutoModelForCausalLM.from_pretrained(args.model).eval()
+    rss_fp32 = rss_mb()
+    int8 = quantize_int8(copy.deepcopy(fp32)).eval()
+    rss_int8 = rss_mb()
+
+    prompts = PROMPTS * args.repeat
+    results = {}
+    for name, mdl in (("fp32", fp32), ("int8", int8)):
+        run(mdl, tok, PROMPTS[:2], 4)  # warm-up
+        replies, tokens, seconds = run(mdl, tok, prompts, args.max_new_tokens)
+        results[name] = {
+            "weights_mb": round(weights_mb(mdl), 1),
+            "ms_per_token": round(seconds / max(tokens, 1) * 1000.0, 3),
+            "ms_per_reply": round(seconds / len(prompts) * 1000.0, 2),
+            "replies": replies[:len(PROMPTS)],
+        }
+
+    # agreement: identical reply text, and share of generated tokens matching fp32 position by position
+    same_text = same_tok = total_tok = 0
+    for (a_ids, a_txt), (b_ids, b_txt) in zip(results["fp32"]["replies"], results["int8"]["replies"]):
+        same_text += a_txt == b_txt
+        total_tok += max(len(a_ids), 1)
+        same_tok += sum(x == y for x, y in zip(a_ids, b_ids))
+
+    report = {
+        "model": args.model,
+        "prompts": len(PROMPTS),
+        "rss_mb": {"fp32_model": round(rss_fp32 - rss_before, 1), "int8_copy": round(rss_int8 - rss_fp32, 1)},
+        "fp32": {k: v for k, v in results["fp32"].items() if k != "replies"},
+        "int8": {k: v for k, v in results["int8"].items() if k != "replies"},
+        "agreement": {"identical_replies": same_text / len(PROMPTS), "token_match": same_tok / total_tok},
+        "samples": [
+            {"prompt": p, "fp32": a[1], "int8": b[1]}
+            for p, a, b in zip(PROMPTS, results["fp32"]["replies"], results["int8"]["replies"])
+        ],
+    }
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+
+    print(f"model: {args.model}  ({len(prompts)} generations, max_new_tokens={args.max_new_tokens})")
+    print(f"{'':6} {'weights MB':>11} {'ms/token':>9} {'ms/reply':>9}")
+    for name in ("fp32", "int8"):
+        r = report[name]
+        print(f"{name:6} {r['weights_mb']:>11} {r['ms_per_token']:>9} {r['ms_per_reply']:>9}")
+    print(f"RSS added: fp32 model {report['rss_mb']['fp32_model']} MB, int8 copy {report['rss_mb']['int8_copy']} MB")
+    print(f"agreement: {report['agreement']['identical_replies']:.0%} identical replies, "
+          f"{report['agreement']['token_match']:.0%} matching tokens")
+    for s in report["samples"]:
+        print(f"  {s['prompt']!r}\n    fp32: {s['fp32']!r}\n    int8: {s['int8']!r}")
+
+
+if __name__ == "__main__":
+    main()
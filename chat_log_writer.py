@@ -0,0 +1,309 @@
+# chat_log_writer.py
+# Optional write-behind buffer for chat_logs: routes append rows and return immediately, one
+# background thread per worker writes them with a multi-row executemany + a single commit once
+# `max_batch` rows are waiting or the oldest row is `flush_interval` old.
+# A single FIFO writer means rows reach MySQL in exactly the order they were appended, so
+# every conversation keeps its order (auto-increment chat_id follows append order; created_at
+# is the flush time, at most flush_interval + one batch later than the request).
+# Both this writer and the direct path in app.py go through insert_chat_logs(), which also keeps
+# the `conversations` summary table (migrations/002) up to date in the same transaction.
+# A batch that fails for a transient reason (lost connection, pool timeout, lock wait) is retried
+# until it is written; one that fails permanently (bad data, integrity error) is split into
+# single rows so only the offending rows are dropped — to the dead-letter log / file — and
+# every other row, including the ones queued behind them, is still written in order.
+# While MySQL is down the queue fills up to `max_pending`; append() then waits at most
+# `append_timeout` for room and raises ChatLogBacklogFull, so routes answer 503 instead of
+# every request thread hanging until the database is back.
+# on_write(callback) hooks run in the writer thread after each commit with the written rows and
+# their chat_ids (app.py pushes them to the /chat/events streams from there).
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from metrics import REGISTRY
+
+log = logging.getLogger(__name__)
+dead_letter_log = logging.getLogger(__name__ + ".dead_letter")
+
+INSERT_CHAT_LOG = "INSERT INTO chat_logs (sender_id, receiver_id, message, chat_type) VALUES (%s,%s,%s,%s)"
+# plain %s placeholders only, so executemany sends one multi-row statement
+# (last_activity_at: column default on insert, NOW() on update)
+UPSERT_CONVERSATION = """
+    INSERT INTO conversations (conversation_key, user_low, user_high, last_message, last_sender_id,
+                               last_chat_type, unread_low, unread_high)
+    VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
+    ON DUPLICATE KEY UPDATE last_message = VALUES(last_message), last_sender_id = VALUES(last_sender_id),
+        last_chat_type = VALUES(last_chat_type), last_activity_at = NOW(),
+        unread_low = unread_low + VALUES(unread_low), unread_high = unread_high + VALUES(unread_high)
+"""
+
+
+# DB-API / MySQLdb error classes that retrying can't fix (matched by name: MySQLdb is optional here)
+PERMANENT_ERRORS = ("DataError", "IntegrityError", "ProgrammingError", "NotSupportedError")
+
+
+def is_permanent_error(e):
+    if isinstance(e, (ValueError, TypeError, KeyError)):
+        return True
+    return any(cls.__name__ in PERMANENT_ERRORS for cls in type(e).__mro__)
+
+
+def chat_log_row(sender_id, receiver_id, message, chat_type):
+    """Validated (sender_id, receiver_id, message, chat_type); ValueError for unusable input."""
+    if isinstance(sender_id, bool) or isinstance(receiver_id, bool):
+        raise ValueError("user ids must be numbers")
+    return int(sender_id), int(receiver_id), str(message), str(chat_type)
+
+
+def is_system_note(row):
+    # "System: ..." trace rows are for the log, not the inbox preview / unread badge
+    return row[3] == 'system' or str(row[2]).startswith("System:")
+
+
+def conversation_updates(rows):
+    """One UPSERT_CONVERSATION parameter tuple per conversation touched by `rows` (in order:
+    the last row is the conversation's last message, unread counts add up), sorted by
+    conversation_key so concurrent batches lock the same rows in the same order."""
+    updates = {}
+    for row in rows:
+        if is_system_note(row):
+            continue
+        sender_id, receiver_id, message, chat_type = row
+        low, high = sorted((int(sender_id), int(receiver_id)))
+        key = f"{low}:{high}"
+        unread_low, unread_high = updates[key][6:8] if key in updates else (0, 0)
+        if int(receiver_id) == low:
+            unread_low += 1
+        else:
+            unread_high += 1
+        updates[key] = (key, low, high, message, sender_id, chat_type, unread_low, unread_high)
+    return [updates[key] for key in sorted(updates)]
+
+
+# MySQLdb's Cursor.max_stmt_length: executemany splits a longer INSERT into several statements
+MAX_STMT_BYTES = 64 * 1024
+
+
+def _statement_chunks(rows):
+    # rows grouped so MySQLdb sends each group as one INSERT (escaping at most doubles a string),
+    # so cur.lastrowid + i is the chat_id of row i within its group
+    chunk, size = [], len(INSERT_CHAT_LOG)
+    for row in rows:
+        row_size = 2 * (len(str(row[2]).encode("utf-8")) + len(str(row[3]).encode("utf-8"))) + 64
+        if chunk and size + row_size > MAX_STMT_BYTES:
+            yield chunk
+            chunk, size = [], len(INSERT_CHAT_LOG)
+        chunk.append(row)
+        size += row_size
+    if chunk:
+        yield chunk
+
+
+def insert_chat_logs(cur, rows):
+    """chat_logs rows + their conversation summaries → the new chat_ids, in row order.
+
+    The caller commits both together. A multi-row INSERT gets consecutive auto-increment ids
+    starting at lastrowid (InnoDB allocates them in one go for a "simple insert").
+    """
+    chat_ids = []
+    for chunk in _statement_chunks(rows):
+        cur.executemany(INSERT_CHAT_LOG, chunk)
+        chat_ids.extend(range(cur.lastrowid, cur.lastrowid + len(chunk)))
+    updates = conversation_updates(rows)
+    if updates:
+        cur.executemany(UPSERT_CONVERSATION, updates)
+    return chat_ids
+
+
+FLUSH_SECONDS = REGISTRY.histogram("ruric_chat_log_flush_seconds", "Time to write one chat_logs batch")
+ROWS = REGISTRY.counter("ruric_chat_log_rows", "chat_logs rows written by the write-behind buffer", ["result"])
+
+
+class ChatLogBacklogFull(Exception):
+    pass
+
+
+class ChatLogWriter:
+    def __init__(self, pool=None, max_batch=100, flush_interval=0.2, max_pending=10000, dead_letter_path=None,
+                 append_timeout=2.0):
+        self.enabled = pool is not None
+        self.pool = pool
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending  # appenders block (backpressure) while this many rows wait
+        self.append_timeout = append_timeout  # ... for at most this long, then ChatLogBacklogFull
+        self.dead_letter_path = dead_letter_path  # JSON lines of rows that could not be written
+        self._queue = deque()  # (row, appended_at)
+        self._inflight = 0  # rows taken by the writer, not committed yet
+        self._flush_now = False
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._listeners = []
+        self.rows_written = self.batches = self.errors = self.dead_letters = 0
+        REGISTRY.gauge("ruric_chat_log_pending", "chat_logs rows waiting to be written",
+                       fn=lambda: len(self._queue) + self._inflight)
+
+    def init_app(self, app, pool):
+        cfg = app.config
+        self.enabled = bool(cfg.get("CHAT_LOG_WRITE_BEHIND", False))
+        self.pool = pool
+        self.max_batch = int(cfg.get("CHAT_LOG_MAX_BATCH", self.max_batch))
+        self.flush_interval = float(cfg.get("CHAT_LOG_FLUSH_MS", self.flush_interval * 1000.0)) / 1000.0
+        self.dead_letter_path = cfg.get("CHAT_LOG_DEAD_LETTER") or None
+        self.append_timeout = float(cfg.get("CHAT_LOG_APPEND_TIMEOUT_MS", self.append_timeout * 1000.0)) / 1000.0
+        if self.enabled:
+            atexit.register(self.close)
+
+    # ---- public ----
+    def append(self, *rows):
+        """Queue (sender_id, receiver_id, message, chat_type) rows; they are written in this order.
+
+        Raises ChatLogBacklogFull (nothing queued) if the queue stays full for `append_timeout`.
+        """
+        now = time.monotonic()
+        with self._cond:
+            self._ensure_thread()
+            while len(self._queue) >= self.max_pending:
+                remaining = now + self.append_timeout - time.monotonic()
+                if remaining <= 0:
+                    ROWS.inc(len(rows), result="rejected")
+                    raise ChatLogBacklogFull(f"{len(self._queue) + self._inflight} chat_logs rows still waiting for MySQL")
+                self._cond.wait(remaining)
+            self._queue.extend((row, now) for row in rows)
+            self._cond.notify_all()
+
+    def on_write(self, callback):
+        # callback([(chat_id, row), ...]) after every commit; dead-lettered rows never reach it
+        self._listeners.append(callback)
+
+    def flush(self, timeout=5.0):
+        """Block until everything appended so far is committed; False if `timeout` ran out first."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if not self._queue and not self._inflight:
+                return True
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                return False
+            self._flush_now = True
+            self._cond.notify_all()
+            while self._queue or self._inflight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def close(self, timeout=5.0):
+        # flush-on-shutdown (atexit + gunicorn worker_exit)
+        if self.enabled and not self.flush(timeout):
+            log.error("chat_logs write-behind: %d rows not written at shutdown", len(self._queue) + self._inflight)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "enabled": self.enabled,
+                "pending": len(self._queue) + self._inflight,
+                "rows_written": self.rows_written,
+                "batches": self.batches,
+                "avg_batch_size": self.rows_written / self.batches if self.batches else 0.0,
+                "errors": self.errors,
+                "dead_letters": self.dead_letters,
+                "max_batch": self.max_batch,
+                "flush_interval_ms": self.flush_interval * 1000.0,
+            }
+
+    # ---- writer thread ----
+    def _ensure_thread(self):
+        # called with the lock held; (re)start after a fork — threads don't survive fork()
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._inflight = 0
+            self._thread = threading.Thread(target=self._run, name="chat-log-writer", daemon=True)
+            self._thread.start()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            # size trigger or time trigger (oldest row waited flush_interval), whichever first
+            while len(self._queue) < self.max_batch and not self._flush_now:
+                remaining = self._queue[0][1] + self.flush_interval - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = [self._queue.popleft()[0] for _ in range(min(self.max_batch, len(self._queue)))]
+            if not self._queue:
+                self._flush_now = False
+            self._inflight = len(batch)
+            self._cond.notify_all()  # room for blocked appenders
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            written = self._write_with_retry(batch)
+            with self._cond:
+                self.rows_written += written
+                self.batches += 1
+                self._inflight = 0
+                self._cond.notify_all()
+            ROWS.inc(written, result="written")
+
+    def _write_with_retry(self, rows):
+        """Write `rows` in order → how many were written (the rest went to the dead letter)."""
+        delay = 0.1
+        while True:
+            try:
+                with FLUSH_SECONDS.time():
+                    self._write(rows)
+                return len(rows)
+            except Exception as e:
+                self.errors += 1
+                if not is_permanent_error(e):
+                    # retry the same rows until they are written: later rows must never overtake them
+                    ROWS.inc(len(rows), result="retry")
+                    log.exception("chat_logs batch of %d rows failed; retrying in %.1fs", len(rows), delay)
+                    time.sleep(delay)
+                    delay = min(delay * 2, 5.0)
+                    continue
+                if len(rows) == 1:
+                    self._dead_letter(rows[0], e)
+                    return 0
+                # find the bad row(s): the same rows one by one, still in order
+                log.warning("chat_logs batch of %d rows rejected (%s); writing rows one by one", len(rows), e)
+                return sum(self._write_with_retry([row]) for row in rows)
+
+    def _dead_letter(self, row, error):
+        self.dead_letters += 1
+        ROWS.inc(result="dead_letter")
+        record = {"row": list(row), "error": f"{type(error).__name__}: {error}", "at": time.time()}
+        dead_letter_log.error("dropped chat_logs row: %s", json.dumps(record, default=str, ensure_ascii=False))
+        if self.dead_letter_path:
+            try:
+                with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, default=str, ensure_ascii=False) + "\n")
+            except OSError:
+                log.exception("could not append to %s", self.dead_letter_path)
+
+    def _write(self, rows):
+        conn = self.pool.acquire()
+        try:
+            cur = conn.cursor()
+            chat_ids = insert_chat_logs(cur, rows)
+            conn.commit()
+            cur.close()
+        except Exception:
+            self.pool.release(conn, discard=True)
+            raise
+        self.pool.release(conn)
+        for callback in self._listeners:
+            try:
+                callback(list(zip(chat_ids, rows)))
+            except Exception:
+                # the rows are committed; never let a listener make the writer retry them
+                log.exception("chat_logs on_write callback failed")
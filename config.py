@@ -9,3 +9,7 @@ class Config:
     MYSQL_USER = os.getenv("DB_USER")
     MYSQL_PASSWORD = os.getenv("DB_PASSWORD")
     MYSQL_DB = os.getenv("DB_NAME")
+
+
+# browser origins of the frontend (CORS in app.py and events_server.py)
+FRONTEND_ORIGINS = ("http://localhost:3000", "http://127.0.0.1:3000", "https://ruric.vercel.app")
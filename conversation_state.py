@@ -0,0 +1,91 @@
+# conversation_state.py
+# Bounded per-conversation store for multi-turn DialoGPT context: the token history of
+# each sender plus the model's past_key_values, so a follow-up turn only has to encode
+# its new tokens. Evicts least-recently-used conversations by count and by total bytes.
+import threading
+from collections import OrderedDict, namedtuple
+
+# history: list of token ids (turns separated by EOS); past: KV cache covering a prefix
+# of history (or None); nbytes: memory charged against the store's byte budget
+ConversationState = namedtuple("ConversationState", ["history", "past", "nbytes"])
+
+
+def cache_nbytes(past):
+    """Approximate memory held by a transformers KV cache (DynamicCache or legacy tuples)."""
+    if past is None:
+        return 0
+    tensors = []
+    layers = getattr(past, "layers", None)
+    if layers is not None:
+        for layer in layers:
+            tensors += [getattr(layer, "keys", None), getattr(layer, "values", None)]
+    elif hasattr(past, "key_cache"):
+        tensors = list(past.key_cache) + list(past.value_cache)
+    else:
+        tensors = [t for layer in past for t in layer]
+    return sum(t.numel() * t.element_size() for t in tensors if t is not None and hasattr(t, "numel"))
+
+
+class ConversationStore:
+    def __init__(self, max_sessions=1000, max_bytes=256 * 1024 * 1024):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # key -> ConversationState
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def take(self, key):
+        """Remove and return the state for `key` (the caller owns it until put() back), or None."""
+        with self._lock:
+            state = self._data.pop(key, None)
+            if state is None:
+                self.misses += 1
+                return None
+            self._bytes -= state.nbytes
+            self.hits += 1
+            return state
+
+    def put(self, key, state):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            if state.nbytes > self.max_bytes:
+                # a single oversized conversation keeps its history but not its KV cache
+                state = state._replace(past=None, nbytes=len(state.history) * 8)
+            self._data[key] = state
+            self._bytes += state.nbytes
+            while self._data and (len(self._data) > self.max_sessions or self._bytes > self.max_bytes):
+                _, evicted = self._data.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def drop(self, key):
+        with self._lock:
+            state = self._data.pop(key, None)
+            if state is not None:
+                self._bytes -= state.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._data),
+                "max_sessions": self.max_sessions,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
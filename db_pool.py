@@ -0,0 +1,202 @@
+# db_pool.py
+# Bounded MySQL connection pool with a flask_mysqldb-compatible front end: `mysql.connection`
+# checks a connection out on first use in an app context and hands it back at teardown, so
+# requests reuse warm connections instead of paying connect + charset setup every time.
+# Every new connection runs the session setup (utf8mb4 etc.); idle connections are pinged
+# before reuse; waits for a free connection are timed and exported as metrics.
+import os
+import threading
+import time
+from collections import deque
+
+from flask import g, has_app_context
+
+from metrics import REGISTRY
+
+POOL_WAIT_SECONDS = REGISTRY.histogram("ruric_db_pool_wait_seconds", "Time spent waiting to check out a DB connection",
+                                       buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0))
+POOL_EVENTS = REGISTRY.counter("ruric_db_pool_events", "Pool connects, reconnects after a failed ping, timeouts",
+                               ["event"])
+
+# run on every new connection (the charset is also passed to connect(); SET NAMES makes the
+# collation + client/result charsets explicit regardless of server defaults)
+DEFAULT_SESSION_SQL = ("SET NAMES utf8mb4",)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, connect, size=10, timeout=5.0, session_sql=DEFAULT_SESSION_SQL, ping_after=1.0):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.session_sql = tuple(session_sql)
+        self.ping_after = ping_after  # idle seconds after which a connection is pinged on checkout
+        self._idle = deque()  # (conn, returned_at); LIFO so the warmest connection is reused
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._pid = os.getpid()
+        self.created = self.reconnects = self.timeouts = self.waits = 0
+        self.wait_seconds = 0.0
+
+    def _check_fork(self):
+        # a forked worker must not share sockets with its parent: forget (don't close!) them
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle.clear()
+            self._in_use = 0
+
+    def _new_connection(self):
+        conn = self._connect()
+        try:
+            cur = conn.cursor()
+            for sql in self.session_sql:
+                cur.execute(sql)
+            cur.close()
+        except Exception:
+            conn.close()
+            raise
+        self.created += 1
+        POOL_EVENTS.inc(event="connect")
+        return conn
+
+    def _healthy(self, conn, idle_for):
+        if idle_for < self.ping_after:
+            return True
+        try:
+            conn.ping()
+            return True
+        except Exception:
+            return False
+
+    def acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        started = time.perf_counter()
+        with self._cond:
+            self._check_fork()
+            waited = False
+            while not self._idle and self._in_use >= self.size:
+                waited = True
+                remaining = timeout - (time.perf_counter() - started)
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    if self._idle or self._in_use < self.size:
+                        break  # freed right at the deadline
+                    self.timeouts += 1
+                    POOL_EVENTS.inc(event="timeout")
+                    raise PoolTimeout(f"no free DB connection within {timeout:.1f}s (pool size {self.size})")
+            conn, returned_at = self._idle.pop() if self._idle else (None, None)
+            self._in_use += 1
+            if waited:
+                self.waits += 1
+        wait = time.perf_counter() - started
+        self.wait_seconds += wait
+        POOL_WAIT_SECONDS.observe(wait)
+
+        # connect / ping outside the lock so one slow server round trip doesn't block the pool
+        try:
+            if conn is not None and not self._healthy(conn, time.monotonic() - returned_at):
+                self._close(conn)
+                conn = None
+                self.reconnects += 1
+                POOL_EVENTS.inc(event="reconnect")
+            if conn is None:
+                conn = self._new_connection()
+            return conn
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, discard=False):
+        with self._cond:
+            if self._pid != os.getpid():
+                return  # checked out before a fork; belongs to the parent
+            self._in_use -= 1
+            if not discard:
+                try:
+                    conn.rollback()  # never hand an open transaction to the next request
+                except Exception:
+                    discard = True
+            if discard:
+                self._close(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            while self._idle:
+                self._close(self._idle.pop()[0])
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._cond:
+            in_use, idle = self._in_use, len(self._idle)
+        return {
+            "size": self.size,
+            "in_use": in_use,
+            "idle": idle,
+            "saturation": in_use / self.size if self.size else 0.0,
+            "created": self.created,
+            "reconnects": self.reconnects,
+            "waits": self.waits,
+            "timeouts": self.timeouts,
+            "wait_seconds_total": round(self.wait_seconds, 6),
+        }
+
+
+class PooledMySQL:
+    """Drop-in for flask_mysqldb.MySQL: same MYSQL_* config keys, same `.connection` property."""
+
+    def __init__(self, app=None):
+        self.pool = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        cfg = app.config
+        cfg.setdefault("MYSQL_HOST", "localhost")
+        cfg.setdefault("MYSQL_PORT", 3306)
+        cfg.setdefault("MYSQL_CHARSET", "utf8mb4")
+        cfg.setdefault("MYSQL_POOL_SIZE", 10)
+        cfg.setdefault("MYSQL_POOL_TIMEOUT", 5.0)
+        cfg.setdefault("MYSQL_POOL_PING_AFTER", 1.0)
+
+        def connect():
+            import MySQLdb  # mysqlclient, installed with Flask-MySQLdb
+
+            return MySQLdb.connect(host=cfg["MYSQL_HOST"], port=int(cfg["MYSQL_PORT"]), user=cfg.get("MYSQL_USER"),
+                                   passwd=cfg.get("MYSQL_PASSWORD"), db=cfg.get("MYSQL_DB"),
+                                   charset=cfg["MYSQL_CHARSET"])
+
+        self.pool = ConnectionPool(connect, size=int(cfg["MYSQL_POOL_SIZE"]),
+                                   timeout=float(cfg["MYSQL_POOL_TIMEOUT"]),
+                                   session_sql=(f"SET NAMES {cfg['MYSQL_CHARSET']}",),
+                                   ping_after=float(cfg["MYSQL_POOL_PING_AFTER"]))
+        REGISTRY.gauge("ruric_db_pool_size", "Maximum DB connections per worker", fn=lambda: self.pool.size)
+        REGISTRY.gauge("ruric_db_pool_in_use", "DB connections checked out", fn=lambda: self.pool.stats()["in_use"])
+        REGISTRY.gauge("ruric_db_pool_idle", "Idle pooled DB connections", fn=lambda: self.pool.stats()["idle"])
+        app.teardown_appcontext(self.teardown)
+
+    @property
+    def connection(self):
+        if not has_app_context():
+            return None
+        conn = g.get("_db_conn")
+        if conn is None:
+            conn = g._db_conn = self.pool.acquire()
+        return conn
+
+    def teardown(self, exception):
+        conn = g.pop("_db_conn", None)
+        if conn is not None:
+            self.pool.release(conn)
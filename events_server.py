@@ -0,0 +1,186 @@
+# events_server.py
+# Serves /chat/events (Server-Sent Events) from one asyncio process instead of the gunicorn
+# workers. A stream is open for as long as a chat window is, and in a gthread worker each one
+# held a whole thread, so a handful of open windows starved every other request. Here a stream
+# is a coroutine plus a socket, so thousands fit in this process and the web workers keep
+# every thread for real requests.
+#   - events come from the pubsub relay (pubsub.py): the workers publish each committed chat
+#     message there and this process is just another relay subscriber, so it needs
+#     PUBSUB_SOCKET + PUBSUB_AUTHKEY like the workers
+#   - same URLs and event format as the in-worker route in app.py, so the frontend only needs
+#     the reverse proxy to send /chat/events/ here, e.g. for nginx:
+#         location /chat/events/ { proxy_pass http://127.0.0.1:5001; proxy_buffering off; }
+#   - GET /health: open streams + relay status
+#
+#   PUBSUB_AUTHKEY=<secret> python pubsub.py
+#   PUBSUB_AUTHKEY=<secret> PUBSUB_SOCKET=... python events_server.py   # EVENTS_BIND=0.0.0.0:5001
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+
+from config import FRONTEND_ORIGINS
+from local_socket import default_socket, require_authkey
+from pubsub import EventBroker, Subscription
+
+log = logging.getLogger("events_server")
+
+EVENTS_KEEPALIVE_SECONDS = float(os.getenv("EVENTS_KEEPALIVE_SECONDS", "15"))
+EVENTS_MAX_SECONDS = float(os.getenv("EVENTS_MAX_SECONDS", "300"))
+
+_ROUTE = re.compile(r"^/chat/events/(\d+)(?:/(\d+))?/?$")
+
+
+def conversation_key(a, b):
+    # same "<low>:<high>" key as app.conversation_key / migrations/001
+    low, high = sorted((int(a), int(b)))
+    return f"{low}:{high}"
+
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+class AsyncSubscription(Subscription):
+    """A Subscription the event loop can await; deliver() still runs on the relay reader thread."""
+
+    def __init__(self, broker, topics, max_pending, loop):
+        super().__init__(broker, topics, max_pending)
+        self._loop = loop
+        self._ready = asyncio.Event()
+
+    def deliver(self, topic, event):
+        super().deliver(topic, event)
+        self._loop.call_soon_threadsafe(self._ready.set)
+
+    async def next(self, timeout):
+        """(topic, event), or None if nothing arrived within `timeout` seconds."""
+        self._ready.clear()
+        item = self.get(0)
+        if item is not None:
+            return item
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        return self.get(0)
+
+
+class EventsServer:
+    def __init__(self, broker, origins=FRONTEND_ORIGINS, keepalive=EVENTS_KEEPALIVE_SECONDS,
+                 max_seconds=EVENTS_MAX_SECONDS):
+        self.broker = broker
+        self.origins = tuple(origins)
+        self.keepalive = keepalive
+        self.max_seconds = max_seconds
+        self.streams = 0
+        self.served = 0
+
+    async def start(self, host, port):
+        return await asyncio.start_server(self.handle, host, port)
+
+    # ---- HTTP ----
+    async def handle(self, reader, writer):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10.0)
+            lines = head.decode("latin-1").split("\r\n")
+            method, target, _ = lines[0].split(" ", 2)
+            headers = {k.strip().lower(): v.strip() for k, _, v in (line.partition(":") for line in lines[1:] if line)}
+            path = target.split("?", 1)[0]
+            cors = self._cors_headers(headers.get("origin"))
+            match = _ROUTE.match(path)
+            if method == "OPTIONS":
+                await self._respond(writer, "204 No Content", cors)
+            elif method == "GET" and path == "/health":
+                body = json.dumps({"streams": self.streams, "served": self.served, **self.broker.stats()})
+                await self._respond(writer, "200 OK", cors + [("Content-Type", "application/json")], body)
+            elif method == "GET" and match:
+                user_id, peer_id = match.groups()
+                topic = f"conv:{conversation_key(user_id, peer_id)}" if peer_id else f"user:{int(user_id)}"
+                await self._stream(reader, writer, topic, cors)
+            else:
+                await self._respond(writer, "404 Not Found", cors + [("Content-Type", "application/json")],
+                                    json.dumps({"error": "not found"}))
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ValueError):
+            pass  # not HTTP, or the client left before sending a full request
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def _cors_headers(self, origin):
+        if origin not in self.origins:
+            return []
+        return [("Access-Control-Allow-Origin", origin), ("Access-Control-Allow-Credentials", "true"),
+                ("Access-Control-Allow-Methods", "GET, OPTIONS"), ("Vary", "Origin")]
+
+    async def _respond(self, writer, status, headers, body=""):
+        data = body.encode("utf-8")
+        head = [f"HTTP/1.1 {status}", f"Content-Length: {len(data)}", "Connection: close"]
+        head += [f"{k}: {v}" for k, v in headers]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data)
+        await writer.drain()
+
+    # ---- SSE ----
+    async def _stream(self, reader, writer, topic, cors):
+        loop = asyncio.get_running_loop()
+        sub = self.broker.attach(AsyncSubscription(self.broker, (topic,), self.broker.max_pending, loop))
+        self.streams += 1
+        self.served += 1
+        # the client never sends anything after the request: EOF on the read side = it left
+        gone = asyncio.ensure_future(reader.read(1))
+        try:
+            head = ["HTTP/1.1 200 OK", "Content-Type: text/event-stream", "Cache-Control: no-cache",
+                    "X-Accel-Buffering: no", "Connection: close"] + [f"{k}: {v}" for k, v in cors]
+            writer.write(("\r\n".join(head) + "\r\n\r\nretry: 2000\n\n").encode("utf-8"))
+            await writer.drain()
+            closes_at = loop.time() + self.max_seconds
+            while loop.time() < closes_at:
+                waiter = asyncio.ensure_future(sub.next(min(self.keepalive, max(0.0, closes_at - loop.time()))))
+                await asyncio.wait((waiter, gone), return_when=asyncio.FIRST_COMPLETED)
+                if gone.done():
+                    waiter.cancel()
+                    break
+                item = waiter.result()
+                if sub.lagged:
+                    sub.lagged = False
+                    writer.write(sse_event("resync", {}).encode("utf-8"))
+                if item is None:
+                    writer.write(b": keepalive\n\n")
+                else:
+                    writer.write(sse_event("message", item[1]).encode("utf-8"))
+                await writer.drain()
+        finally:
+            gone.cancel()
+            sub.close()
+            self.streams -= 1
+
+
+def main():
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    parser = argparse.ArgumentParser(description="SSE server for /chat/events")
+    parser.add_argument("--bind", default=os.getenv("EVENTS_BIND", "0.0.0.0:5001"))
+    parser.add_argument("--socket", default=os.getenv("PUBSUB_SOCKET") or default_socket("pubsub.sock"))
+    args = parser.parse_args()
+    try:
+        authkey = require_authkey(os.getenv("PUBSUB_AUTHKEY", ""), "PUBSUB_AUTHKEY")
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+    broker = EventBroker(args.socket, authkey, max_pending=int(os.getenv("PUBSUB_MAX_PENDING", "100")))
+    host, _, port = args.bind.rpartition(":")
+
+    async def run():
+        server = await EventsServer(broker).start(host or "0.0.0.0", int(port))
+        broker.connect()  # to the relay now, not on the first stream
+        log.info("events server listening on %s, relay %s", args.bind, args.socket)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# faq_retrieval.py
+# Char n-gram TF-IDF retrieval over the FAQ questions (NumPy only).
+# The question matrix is built once and stored column-major (term → postings), so
+# scoring a message is one sparse matrix-vector product touching only its n-grams.
+import math
+import re
+from collections import Counter
+
+import numpy as np
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def char_ngrams(text, ngram_range=(3, 4)):
+    # like sklearn's char_wb analyzer: n-grams inside space-padded words only
+    lo, hi = ngram_range
+    grams = []
+    for word in _NON_WORD.sub(" ", text.lower()).split():
+        padded = f" {word} "
+        for n in range(lo, hi + 1):
+            if len(padded) < n:
+                break
+            grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return grams
+
+
+class TfidfRetriever:
+    def __init__(self, questions, answers, ngram_range=(3, 4)):
+        self.questions = list(questions)
+        self.answers = list(answers)
+        self.ngram_range = ngram_range
+        self.vocab = {}
+
+        rows, cols, tfs = [], [], []
+        for i, q in enumerate(self.questions):
+            for gram, count in Counter(char_ngrams(q, ngram_range)).items():
+                rows.append(i)
+                cols.append(self.vocab.setdefault(gram, len(self.vocab)))
+                tfs.append(count)
+
+        n_docs, n_terms = len(self.questions), len(self.vocab)
+        rows = np.asarray(rows, dtype=np.int32)
+        cols = np.asarray(cols, dtype=np.int32)
+        tfs = np.asarray(tfs, dtype=np.float32)
+
+        # smoothed idf + sublinear tf, rows l2-normalised (cosine similarity = dot product)
+        df = np.bincount(cols, minlength=n_terms).astype(np.float32)
+        self.idf = (np.log((1.0 + n_docs) / (1.0 + df)) + 1.0).astype(np.float32)
+        vals = (1.0 + np.log(tfs)) * self.idf[cols]
+        norms = np.sqrt(np.bincount(rows, weights=vals * vals, minlength=n_docs)).astype(np.float32)
+        vals /= np.where(norms > 0, norms, 1.0)[rows]
+
+        # CSC layout: postings of term j are doc_ids[indptr[j]:indptr[j + 1]]
+        order = np.argsort(cols, kind="stable")
+        self.doc_ids = rows[order]
+        self.weights = vals[order].astype(np.float32)
+        self.indptr = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cols, minlength=n_terms), out=self.indptr[1:])
+
+    def __len__(self):
+        return len(self.questions)
+
+    def _query(self, text):
+        grams = char_ngrams(text, self.ngram_range)
+        counts = Counter(g for g in grams if g in self.vocab)
+        if not counts:
+            return None, None
+        terms = np.fromiter((self.vocab[g] for g in counts), dtype=np.int64, count=len(counts))
+        tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        w = (1.0 + np.log(tf)) * self.idf[terms]
+        # n-grams unseen in the FAQ still count toward the query norm (with the max idf)
+        unseen = len(grams) - int(tf.sum())
+        unseen_idf = math.log(1.0 + len(self.questions)) + 1.0
+        norm = math.sqrt(float(w @ w) + unseen * unseen_idf * unseen_idf)
+        return terms, w / norm
+
+    def scores(self, text):
+        """Cosine similarity of `text` against every FAQ question (float32 array)."""
+        out = np.zeros(len(self.questions), dtype=np.float32)
+        terms, qw = self._query(text)
+        if terms is None:
+            return out
+        starts, ends = self.indptr[terms], self.indptr[terms + 1]
+        lens = ends - starts
+        total = int(lens.sum())
+        if total == 0:
+            return out
+        # gather every posting of the query terms in one vectorised step
+        offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(lens)[:-1])), lens) + np.arange(total)
+        contrib = self.weights[offsets] * np.repeat(qw, lens)
+        out += np.bincount(self.doc_ids[offsets], weights=contrib, minlength=len(self.questions)).astype(np.float32)
+        return out
+
+    def top(self, text, k=5):
+        """[(question, score), ...] best first, for debugging thresholds."""
+        s = self.scores(text)
+        if not len(s):
+            return []
+        k = min(k, len(s))
+        idx = np.argpartition(-s, k - 1)[:k]
+        idx = idx[np.argsort(-s[idx], kind="stable")]
+        return [(self.questions[i], float(s[i])) for i in idx]
+
+    def best(self, text, threshold):
+        """Return (question, answer, score) of the best match at or above `threshold`, else None."""
+        s = self.scores(text)
+        if not len(s):
+            return None
+        i = int(np.argmax(s))
+        if s[i] < threshold:
+            return None
+        return self.questions[i], self.answers[i], float(s[i])
@@ -0,0 +1,176 @@
+# faq_store.py
+# Hot-reloadable FAQ index. The Excel sheet is read through a vectorized pandas pipeline,
+# compiled (intent router + TF-IDF retriever + typo-tolerant BK-trees) and cached as a pickle snapshot keyed by the
+# hash of the sheet + intents.yaml, so later worker boots skip openpyxl entirely.
+# A changed sheet is noticed by mtime polling and the new index is swapped in atomically:
+# requests grab FaqStore.current() once and keep using that object until they finish.
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import namedtuple
+
+from intent_router import IntentRouter, load_intent_table
+from faq_retrieval import TfidfRetriever
+from fuzzy_index import FuzzyFaqIndex
+
+log = logging.getLogger(__name__)
+
+# bump when the pickled classes change shape so stale snapshots are ignored
+SNAPSHOT_VERSION = 4
+
+FaqIndex = namedtuple("FaqIndex", ["responses", "router", "retriever", "fuzzy", "digest", "source", "loaded_at"])
+
+
+def read_sheet(path):
+    """First column = question, second = answer → {question (lowercased): answer}."""
+    import pandas as pd
+
+    df = pd.read_excel(path, usecols=[0, 1], dtype=str).dropna()
+    questions = df.iloc[:, 0].str.strip().str.lower()
+    answers = df.iloc[:, 1].str.strip()
+    return dict(zip(questions.tolist(), answers.tolist()))
+
+
+def _known_words(intent_table, responses):
+    # correctly spelled vocabulary the spelling corrector must not rewrite
+    for spec in (intent_table.get("intents") or {}).values():
+        yield from (str(t) for t in spec.get("triggers") or [])
+    yield from responses.values()
+
+
+def build_index(responses, intent_table, digest="", source="memory"):
+    return FaqIndex(
+        responses=responses,
+        router=IntentRouter(intent_table, responses),
+        retriever=TfidfRetriever(responses.keys(), responses.values()),
+        fuzzy=FuzzyFaqIndex(responses.keys(), _known_words(intent_table, responses)),
+        digest=digest,
+        source=source,
+        loaded_at=time.time(),
+    )
+
+
+class FaqStore:
+    def __init__(self, sheet_path, intents_path, snapshot_dir=None, poll_interval=5.0):
+        self.sheet_path = sheet_path
+        self.intents_path = intents_path
+        self.snapshot_dir = snapshot_dir
+        self.poll_interval = poll_interval
+        self._index = None
+        self._mtimes = None
+        self._last_poll = 0.0
+        self._reload_lock = threading.Lock()
+        self._listeners = []
+        self.reloads = 0
+        self.reload_errors = 0
+
+    # ---- public ----
+    def current(self):
+        """The live FaqIndex; also triggers a (rate-limited, non-blocking) change check."""
+        if self.poll_interval > 0 and time.monotonic() - self._last_poll >= self.poll_interval:
+            self._last_poll = time.monotonic()
+            if self._mtimes != self._stat() and not self._reload_lock.locked():
+                threading.Thread(target=self.reload, name="faq-reload", daemon=True).start()
+        return self._index
+
+    def on_reload(self, callback):
+        # callback(new_index) runs after every successful swap
+        self._listeners.append(callback)
+
+    def load(self):
+        """Initial synchronous load; an unreadable sheet gives an empty FAQ (rules still work)."""
+        if not self.reload():
+            self._index = build_index({}, load_intent_table(self.intents_path), source="empty")
+        return self._index
+
+    def swap(self, index):
+        # used by reload() and by benchmarks that install synthetic FAQ sets
+        self._index = index
+        self.reloads += 1
+        for callback in self._listeners:
+            callback(index)
+
+    def reload(self):
+        with self._reload_lock:
+            mtimes = self._stat()
+            try:
+                index = self._load_index()
+            except Exception as e:
+                # e.g. the sheet is mid-save: keep serving the old index, retry on the next poll
+                self.reload_errors += 1
+                log.warning("FAQ reload failed: %s", e)
+                return False
+            self._mtimes = mtimes
+            if self._index is not None and self._index.digest == index.digest:
+                return True  # touched but unchanged
+            self.swap(index)
+            log.info("FAQ index ready: %d questions (%s)", len(index.responses), index.source)
+            return True
+
+    def stats(self):
+        index = self._index
+        return {
+            "questions": len(index.responses) if index else 0,
+            "digest": index.digest if index else None,
+            "source": index.source if index else None,
+            "loaded_at": index.loaded_at if index else None,
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+        }
+
+    # ---- internals ----
+    def _stat(self):
+        out = []
+        for path in (self.sheet_path, self.intents_path):
+            try:
+                st = os.stat(path)
+                out.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                out.append(None)
+        return tuple(out)
+
+    def _load_index(self):
+        with open(self.sheet_path, "rb") as f:
+            sheet_bytes = f.read()
+        with open(self.intents_path, "rb") as f:
+            intents_bytes = f.read()
+        h = hashlib.sha256(sheet_bytes)
+        h.update(intents_bytes)
+        h.update(str(SNAPSHOT_VERSION).encode())
+        digest = h.hexdigest()[:16]
+
+        snapshot = os.path.join(self.snapshot_dir, f"faq-{digest}.pkl") if self.snapshot_dir else None
+        if snapshot and os.path.exists(snapshot):
+            try:
+                with open(snapshot, "rb") as f:
+                    data = pickle.load(f)
+                if data.get("version") == SNAPSHOT_VERSION:
+                    return data["index"]._replace(source="snapshot", loaded_at=time.time())
+            except Exception as e:
+                log.warning("FAQ snapshot unreadable, rebuilding: %s", e)
+
+        index = build_index(read_sheet(self.sheet_path), load_intent_table(self.intents_path), digest, "excel")
+        if snapshot:
+            self._write_snapshot(snapshot, index)
+        return index
+
+    def _write_snapshot(self, path, index):
+        try:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump({"version": SNAPSHOT_VERSION, "index": index}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)  # atomic: other workers never see a half-written snapshot
+            # keep only the few most recent snapshots around
+            old = sorted(
+                (os.path.join(self.snapshot_dir, name) for name in os.listdir(self.snapshot_dir)
+                 if name.startswith("faq-") and name.endswith(".pkl")),
+                key=os.path.getmtime, reverse=True,
+            )[5:]
+            for stale in old:
+                os.remove(stale)
+        except OSError as e:
+            log.warning("Could not write FAQ snapshot: %s", e)
@@ -0,0 +1,173 @@
+# fuzzy_index.py
+# Typo-tolerant FAQ lookup, built once per FAQ load:
+#   - a trigram inverted index over the (normalised) FAQ questions for near-exact hits like
+#     "how long does delivry take": k edits can destroy at most 3k trigrams, so only questions
+#     sharing enough trigrams with the message (counted with one bincount) are verified with an
+#     edit-distance computation
+#   - a BK-tree over the vocabulary of the FAQ questions, to correct single misspelled words
+#     ("delivry fee" -> "delivery fee"); words the index already knows (question, answer and
+#     intent trigger words) are never changed, and nlp_model only uses a corrected message when
+#     it hits an FAQ question — it never re-runs the intent router on it;
+#     a query with radius r only visits children whose edge distance lies within r of the
+#     node's distance (triangle inequality)
+import re
+from collections import Counter
+
+import numpy as np
+
+_WORD = re.compile(r"\w+")
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def levenshtein(a, b, limit=None):
+    """Edit distance (insert / delete / substitute, cost 1 each).
+
+    With `limit`, any distance above it is reported as limit + 1, which lets the
+    computation stop as soon as the answer is known to exceed the limit.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if limit is not None and min(cur) > limit:
+            return limit + 1
+        prev = cur
+    return prev[-1]
+
+
+def normalize_question(text):
+    # lowercase, punctuation -> space, collapsed whitespace ("what’s up?" -> "what s up")
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+
+def trigrams(text):
+    return Counter(text[i:i + 3] for i in range(len(text) - 2))
+
+
+class BKTree:
+    def __init__(self, words=()):
+        self._root = None  # [word, {distance: child node}]
+        self._size = 0
+        for word in words:
+            self.add(word)
+
+    def __len__(self):
+        return self._size
+
+    def add(self, word):
+        if self._root is None:
+            self._root = [word, {}]
+            self._size = 1
+            return
+        node = self._root
+        while True:
+            d = levenshtein(word, node[0])
+            if d == 0:
+                return  # already present
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = [word, {}]
+                self._size += 1
+                return
+            node = child
+
+    def search(self, word, radius):
+        """[(distance, word)] for every stored word within `radius`, closest first."""
+        if self._root is None or radius < 0:
+            return []
+        found, stack = [], [self._root]
+        while stack:
+            node = stack.pop()
+            # the exact distance only matters up to radius + the longest child edge: beyond
+            # that no child can be in range, so the distance computation may stop early
+            d = levenshtein(word, node[0], radius + max(node[1], default=0))
+            if d <= radius:
+                found.append((d, node[0]))
+            for edge, child in node[1].items():
+                if d - radius <= edge <= d + radius:
+                    stack.append(child)
+        found.sort()
+        return found
+
+
+class FuzzyFaqIndex:
+    def __init__(self, questions, known_words=()):
+        # normalised question -> original FAQ key (first row wins on collisions)
+        self.questions = {}
+        for q in questions:
+            self.questions.setdefault(normalize_question(q), q)
+        self._keys = list(self.questions)
+        self._lengths = np.fromiter((len(k) for k in self._keys), dtype=np.int32, count=len(self._keys))
+
+        # trigram -> (question ids, occurrence counts), like a CSC column per trigram
+        postings = {}
+        for i, key in enumerate(self._keys):
+            for gram, count in trigrams(key).items():
+                postings.setdefault(gram, ([], []))
+                postings[gram][0].append(i)
+                postings[gram][1].append(count)
+        self._postings = {g: (np.asarray(ids, dtype=np.int32), np.asarray(counts, dtype=np.int32))
+                          for g, (ids, counts) in postings.items()}
+
+        # correction targets: FAQ question words only (word frequency breaks ties)
+        self.vocab = Counter(w for q in self._keys for w in q.split())
+        self._word_tree = BKTree(self.vocab)
+        # correctly spelled words that must be left alone even though they are no target
+        self.known = set(self.vocab)
+        self.known.update(w for phrase in known_words for w in normalize_question(str(phrase)).split())
+
+    def __len__(self):
+        return len(self.questions)
+
+    def lookup(self, text, max_distance):
+        """FAQ key of the closest question within `max_distance` edits, or None.
+
+        Short questions get a tighter radius (a quarter of their length) so "hi" can't turn
+        into some other three-word question; ties go to the earlier sheet row.
+        """
+        query = normalize_question(text)
+        if max_distance <= 0 or not query or not self._keys:
+            return None
+        radius = np.minimum(max_distance, self._lengths // 4)
+
+        shared = np.zeros(len(self._keys), dtype=np.int32)
+        for gram, count in trigrams(query).items():
+            hit = self._postings.get(gram)
+            if hit is not None:
+                shared += np.bincount(hit[0], weights=np.minimum(hit[1], count),
+                                      minlength=len(self._keys)).astype(np.int32)
+        # q-gram lemma: within k edits the strings share >= max(len) - 2 - 3k trigrams
+        need = np.maximum(self._lengths, len(query)) - 2 - 3 * radius
+        candidates = np.flatnonzero((shared >= need) & (np.abs(self._lengths - len(query)) <= radius))
+
+        best, best_d = None, None
+        for i in candidates.tolist():
+            limit = int(radius[i]) if best_d is None else min(int(radius[i]), best_d - 1)
+            if limit < 0:
+                continue
+            d = levenshtein(query, self._keys[i], limit)
+            if d <= limit:
+                best, best_d = i, d
+        return self.questions[self._keys[best]] if best is not None else None
+
+    def correct_word(self, word, max_distance):
+        if word in self.known or len(word) < 4 or word.isdigit():
+            return word
+        # one edit for short words, up to max_distance for longer ones
+        radius = min(max_distance, 1 if len(word) < 8 else 2)
+        hits = self._word_tree.search(word, radius)
+        if not hits:
+            return word
+        best = hits[0][0]
+        return max((w for d, w in hits if d == best), key=lambda w: (self.vocab[w], w))
+
+    def correct(self, text, max_distance):
+        """`text` with misspelled words replaced by FAQ question words (punctuation kept)."""
+        if max_distance <= 0:
+            return text
+        return _WORD.sub(lambda m: self.correct_word(m.group(0), max_distance), text.lower())
@@ -0,0 +1,35 @@
+# generation_budget.py
+# Wall-clock budget for model.generate: a stopping criterion with one absolute deadline
+# per batch row, remembering which rows were cut off by time rather than finishing.
+# torch is only imported when generation actually runs, so the rule/FAQ path stays light.
+import time
+
+# how a fallback generation ended (reported on RouteResult.generation)
+COMPLETE = "complete"   # reached EOS or the max_new_tokens budget
+PARTIAL = "partial"     # deadline hit; the text generated so far is returned
+TIMEOUT = "timeout"     # deadline hit before anything usable was generated
+CACHED = "cached"       # served from the fallback cache, no generation ran
+UNAVAILABLE = "unavailable"  # the (remote) inference server could not be reached
+
+
+class DeadlineCriteria:
+    # duck-types transformers.StoppingCriteria: called with the running input_ids after each
+    # step, returns a per-row bool tensor (True = stop this row)
+    def __init__(self, deadlines, prompt_width, eos_token_id, clock=time.monotonic):
+        self.deadlines = list(deadlines)
+        self.prompt_width = prompt_width
+        self.eos_token_id = eos_token_id
+        self.clock = clock
+        self.timed_out = set()
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+
+        now = self.clock()
+        expired = torch.tensor([now >= d for d in self.deadlines], dtype=torch.bool, device=input_ids.device)
+        if expired.any():
+            # rows that already emitted EOS finished on their own, the rest were cut off
+            finished = (input_ids[:, self.prompt_width:] == self.eos_token_id).any(dim=1)
+            for row in (expired & ~finished).nonzero().flatten().tolist():
+                self.timed_out.add(row)
+        return expired
@@ -0,0 +1,68 @@
+# gunicorn.conf.py
+# Production server config: the app (and DialoGPT) is loaded once in the master and the
+# workers are forked from it, so the model weights are shared copy-on-write instead of being
+# loaded N times. Database connections are only opened inside workers (one pool per worker).
+#
+#   gunicorn -c gunicorn.conf.py            # serves app:app
+#   curl localhost:5000/health/memory       # unique_mb vs shared_mb of the answering worker
+import gc
+import os
+import sys
+
+# load the model synchronously while the master imports the app (see create_app)
+os.environ.setdefault("MODEL_LOAD", "preload")
+
+wsgi_app = "app:app"
+preload_app = True
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+# /chat/events streams belong on events_server.py (the proxy routes them there); any that reach
+# a worker each pin one of these threads, capped at EVENTS_MAX_STREAMS (default threads // 2)
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+# torch intra-op threads per worker: N workers x all cores would oversubscribe the CPU
+torch_threads = int(os.getenv("TORCH_THREADS_PER_WORKER", "1"))
+# log each worker's memory every N requests it serves (0 = only at boot)
+memory_report_every = int(os.getenv("MEMORY_REPORT_EVERY", "0"))
+
+
+def _log_memory(worker, when):
+    from worker_memory import worker_report
+
+    m = worker_report()
+    if m.get("available"):
+        worker.log.info("worker %s memory (%s): unique %.1f MB, shared %.1f MB, rss %.1f MB",
+                        m["pid"], when, m["unique_mb"], m["shared_mb"], m["rss_mb"])
+
+
+def when_ready(server):
+    # runs in the master after preloading, before the first fork: move everything loaded so
+    # far into the GC's permanent generation so collections in workers never write to (and
+    # so never copy) those shared pages
+    gc.collect()
+    gc.freeze()
+    server.log.info("app preloaded; %d objects frozen for copy-on-write sharing", gc.get_freeze_count())
+
+
+def post_fork(server, worker):
+    if "torch" in sys.modules:
+        import torch
+        torch.set_num_threads(torch_threads)
+
+
+def post_worker_init(worker):
+    _log_memory(worker, "boot")
+
+
+def worker_exit(server, worker):
+    # write out buffered chat_logs rows, then close this worker's pooled DB connections cleanly
+    from app import chat_logs, mysql
+
+    chat_logs.close()
+    if mysql.pool is not None:
+        mysql.pool.close_all()
+
+
+def post_request(worker, req, environ, resp):
+    if memory_report_every and worker.nr % memory_report_every == 0:
+        _log_memory(worker, f"{worker.nr} requests")
@@ -0,0 +1,110 @@
+# inference_batcher.py
+# Dynamic micro-batching for model.generate: concurrent callers are queued and a single
+# worker thread runs them together once `max_batch` requests are waiting or the oldest
+# one has waited `max_wait_ms`. Batch sizes and per-request queue waits go to /metrics (and
+# to stats(), which inference_server's status op returns).
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+from metrics import REGISTRY
+
+BATCH_SIZE = REGISTRY.histogram("ruric_generation_batch_size", "Requests per model.generate batch",
+                                buckets=(1, 2, 3, 4, 6, 8, 12, 16, 24, 32))
+QUEUE_WAIT_SECONDS = REGISTRY.histogram("ruric_generation_queue_wait_seconds",
+                                        "Time a generation request waited for its batch to start")
+
+
+class GenerationBatcher:
+    def __init__(self, generate_batch, max_batch=8, max_wait_ms=10.0):
+        # generate_batch(list_of_requests) -> list_of_results (same order)
+        self.generate_batch = generate_batch
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._pid = None
+        # metrics
+        self.batch_sizes = Counter()
+        self.batches = 0
+        self.requests = 0
+        self.queue_wait_total = 0.0
+
+    def _ensure_worker(self):
+        # threads don't survive fork(): (re)start the worker lazily in whichever process submits
+        if self._worker is not None and self._pid == os.getpid() and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._pid == os.getpid() and self._worker.is_alive():
+                return
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._worker = threading.Thread(target=self._run, name="generation-batcher", daemon=True)
+            self._worker.start()
+
+    def submit(self, request, timeout=None):
+        """Queue one request and block until its own result is ready.
+
+        Raises TimeoutError if no result arrives within `timeout` seconds.
+        """
+        if self.max_batch == 1:
+            self._record([0.0])
+            return self.generate_batch([request])[0]
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((time.monotonic(), request, future))
+        return future.result(timeout=timeout)
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        deadline = first[0] + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.monotonic()
+            self._record([started - queued for queued, _, _ in batch])
+            try:
+                results = self.generate_batch([request for _, request, _ in batch])
+                for (_, _, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+
+    def _record(self, waits):
+        # waits: seconds each request of one batch spent queued
+        BATCH_SIZE.observe(len(waits))
+        for waited in waits:
+            QUEUE_WAIT_SECONDS.observe(waited)
+        with self._lock:
+            self.batch_sizes[len(waits)] += 1
+            self.batches += 1
+            self.requests += len(waits)
+            self.queue_wait_total += sum(waits)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "batches": self.batches,
+                "requests": self.requests,
+                "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+                "avg_queue_wait_ms": self.queue_wait_total / self.requests * 1000.0 if self.requests else 0.0,
+                "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+            }
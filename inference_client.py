@@ -0,0 +1,90 @@
+# inference_client.py
+# Thin client for inference_server.py: web workers send fallback generation requests over a
+# Unix socket instead of each loading their own copy of DialoGPT.
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+
+
+class InferenceUnavailable(Exception):
+    pass
+
+
+class InferenceClient:
+    def __init__(self, address, authkey=None, connect_timeout=1.0):
+        self.address = address
+        self.authkey = authkey
+        self.connect_timeout = connect_timeout
+        # one connection per thread: requests on a connection are strictly request/response
+        self._local = threading.local()
+        self.failures = 0
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            try:
+                conn = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+            except (OSError, EOFError, AuthenticationError) as e:
+                # AuthenticationError: INFERENCE_AUTHKEY differs from the server's
+                raise InferenceUnavailable(f"cannot reach inference server at {self.address}: {e}")
+            self._local.conn = conn
+        return conn
+
+    def _drop(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def call(self, request, timeout):
+        """Send one request dict and wait up to `timeout` seconds for its reply dict."""
+        for attempt in (1, 2):
+            conn = self._connection()
+            try:
+                conn.send(request)
+                if not conn.poll(timeout):
+                    # a late answer would be read by the next request on this connection
+                    self._drop()
+                    raise InferenceUnavailable(f"no reply within {timeout:.2f}s")
+                return conn.recv()
+            except (OSError, EOFError) as e:
+                # the server restarted since this connection was opened: reconnect once
+                self._drop()
+                if attempt == 2:
+                    self.failures += 1
+                    raise InferenceUnavailable(str(e))
+            except InferenceUnavailable:
+                self.failures += 1
+                raise
+
+    def generate(self, prompt, max_new_tokens, deadline, sender_id=None):
+        """→ (reply, generation), same contract as the in-process generators."""
+        remaining = deadline - time.monotonic()
+        response = self.call(
+            {"op": "generate", "prompt": prompt, "max_new_tokens": max_new_tokens,
+             "deadline_ms": max(0.0, remaining * 1000.0), "sender_id": sender_id},
+            timeout=max(0.0, remaining) + self.connect_timeout,
+        )
+        if "error" in response:
+            raise InferenceUnavailable(response["error"])
+        return response["reply"], response["generation"]
+
+    def reset(self, sender_id):
+        self.call({"op": "reset", "sender_id": sender_id}, timeout=self.connect_timeout)
+
+    def has_context(self, sender_id):
+        return bool(self.call({"op": "has_context", "sender_id": sender_id}, timeout=self.connect_timeout).get("ok"))
+
+    def remember_turn(self, sender_id, prompt, reply):
+        self.call({"op": "remember_turn", "sender_id": sender_id, "prompt": prompt, "reply": reply},
+                  timeout=self.connect_timeout)
+
+    def status(self):
+        try:
+            return self.call({"op": "status"}, timeout=self.connect_timeout)
+        except InferenceUnavailable as e:
+            return {"model": "unreachable", "error": str(e)}
@@ -0,0 +1,91 @@
+# inference_server.py
+# One local process that owns DialoGPT and serves every gunicorn worker's AI fallbacks over a
+# Unix socket. Requests from all workers share one GenerationBatcher (so they batch together)
+# and one conversation store (so multi-turn context survives whichever worker gets the turn).
+#
+# The socket speaks pickle, so the server and every worker need the same INFERENCE_AUTHKEY
+# (see local_socket.py); the server won't start without one.
+#
+#   INFERENCE_AUTHKEY=<secret> python inference_server.py            # socket from INFERENCE_SOCKET
+#   INFERENCE_AUTHKEY=<secret> INFERENCE_SOCKET=/tmp/ruric-$(id -u)/inference.sock gunicorn app:app
+import argparse
+import logging
+import os
+import time
+
+from local_socket import default_socket, require_authkey, serve
+
+# this process is the model host: it must load the model itself, not forward to a socket
+SOCKET_PATH = os.environ.pop("INFERENCE_SOCKET", "") or default_socket("inference.sock")
+os.environ.setdefault("MODEL_LOAD", "off")
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+import nlp_model  # noqa: E402
+
+log = logging.getLogger("inference_server")
+
+
+def handle(request):
+    op = request.get("op")
+    if op == "generate":
+        deadline = time.monotonic() + float(request.get("deadline_ms") or 0.0) / 1000.0
+        max_new_tokens = int(request.get("max_new_tokens") or nlp_model.GENERATION_MAX_NEW_TOKENS)
+        reply, generation = nlp_model.generate_reply(request["prompt"], max_new_tokens, deadline,
+                                                     request.get("sender_id"))
+        return {"reply": reply, "generation": generation}
+    if op == "reset":
+        nlp_model.reset_conversation(request.get("sender_id"))
+        return {"ok": True}
+    if op == "has_context":
+        return {"ok": nlp_model.has_context(request.get("sender_id"))}
+    if op == "remember_turn":
+        nlp_model.remember_turn(request.get("sender_id"), request["prompt"], request["reply"])
+        return {"ok": True}
+    if op == "status":
+        return {
+            "model": nlp_model.MODEL_STATE["status"],
+            "model_name": nlp_model.MODEL_NAME,
+            "model_precision": nlp_model.MODEL_PRECISION,
+            "model_compile": nlp_model.MODEL_STATE["compile"],
+            "batcher": nlp_model.BATCHER.stats(),
+            "conversations": nlp_model.CONVERSATIONS.stats(),
+            "pid": os.getpid(),
+        }
+    return {"error": f"unknown op {op!r}"}
+
+
+def serve_connection(conn):
+    with conn:
+        while True:
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                return  # worker went away
+            try:
+                response = handle(request)
+            except Exception as e:
+                log.exception("inference request failed")
+                response = {"error": str(e)}
+            try:
+                conn.send(response)
+            except (OSError, EOFError):
+                return
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared DialoGPT inference server")
+    parser.add_argument("--socket", default=SOCKET_PATH)
+    args = parser.parse_args()
+    try:
+        authkey = require_authkey(os.getenv("INFERENCE_AUTHKEY", ""), "INFERENCE_AUTHKEY")
+    except RuntimeError as e:
+        raise SystemExit(str(e))  # before the (slow) model load
+
+    if not nlp_model.load_model():
+        raise SystemExit(f"model failed to load: {nlp_model.MODEL_STATE['error']}")
+    serve(args.socket, authkey, serve_connection, "inference server")
+
+
+if __name__ == "__main__":
+    main()
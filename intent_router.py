@@ -0,0 +1,95 @@
+# intent_router.py
+# Compiles intents.yaml + the FAQ questions into a single Aho-Corasick matcher so a
+# message is classified (help / emotional / greeting / faq / fallback) in one pass.
+from collections import namedtuple
+
+import yaml
+
+from aho_corasick import AhoCorasick
+
+# what the router hands back to nlp_model / app.py; `generation` is only set by the
+# AI fallback (complete / partial / timeout / cached, see generation_budget.py)
+RouteResult = namedtuple("RouteResult", ["intent", "reply", "human_needed", "generation"], defaults=(None,))
+
+FAQ_INTENT = "faq"
+FALLBACK_INTENT = "fallback"
+MATCH_KINDS = ("substring", "word", "exact")
+
+
+def load_intent_table(path):
+    with open(path, encoding="utf-8") as f:
+        table = yaml.safe_load(f) or {}
+    for name, spec in (table.get("intents") or {}).items():
+        if spec.get("match", "substring") not in MATCH_KINDS:
+            raise ValueError(f"intent {name!r}: unknown match kind {spec.get('match')!r}")
+    return table
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == "_"
+
+
+class IntentRouter:
+    def __init__(self, table, faq_responses=None):
+        self.faq_responses = dict(faq_responses or {})
+        self.intents = {}
+        self._matcher = AhoCorasick()
+
+        for name, spec in (table.get("intents") or {}).items():
+            self.intents[name] = {
+                "priority": int(spec.get("priority", 0)),
+                "match": spec.get("match", "substring"),
+                "human_needed": bool(spec.get("human_needed", False)),
+                "reply": spec.get("reply", ""),
+            }
+            for trigger in spec.get("triggers") or []:
+                trigger = str(trigger).strip().lower()
+                self._matcher.add(trigger, (name, trigger))
+
+        faq = table.get("faq") or {}
+        self.faq_priority = int(faq.get("priority", 0))
+        self.faq_human_needed = bool(faq.get("human_needed", False))
+        # FAQ keys are already stripped + lowercased by nlp_model
+        for question in self.faq_responses:
+            self._matcher.add(question, (FAQ_INTENT, question))
+
+        fallback = table.get("fallback") or {}
+        self.fallback_reply = fallback.get("reply", "")
+        self.fallback_human_needed = bool(fallback.get("human_needed", True))
+        self._matcher.build()
+
+    def _accepts(self, kind, text, start, end):
+        if kind == "exact":
+            return start == 0 and end == len(text)
+        if kind == "word":
+            return (start == 0 or not _is_word_char(text[start - 1])) and \
+                   (end == len(text) or not _is_word_char(text[end]))
+        return True
+
+    def classify(self, text):
+        """Return (intent, key) for the best match in `text`; key is the FAQ question for faq hits."""
+        best_rank, best = None, (FALLBACK_INTENT, None)
+        for start, end, idx in self._matcher.iter_matches(text):
+            name, key = self._matcher.values[idx]
+            if name == FAQ_INTENT:
+                exact = start == 0 and end == len(text)
+                # exact question > longest partial question > earliest sheet row
+                rank = (self.faq_priority, exact, end - start, -idx)
+            else:
+                spec = self.intents[name]
+                if not self._accepts(spec["match"], text, start, end):
+                    continue
+                rank = (spec["priority"], True, end - start, -idx)
+            if best_rank is None or rank > best_rank:
+                best_rank, best = rank, (name, key)
+        return best
+
+    def route(self, text):
+        """Classify and attach the reply; fallback results carry reply=None so the caller can try the model."""
+        name, key = self.classify(text)
+        if name == FAQ_INTENT:
+            return RouteResult(FAQ_INTENT, self.faq_responses[key], self.faq_human_needed)
+        if name == FALLBACK_INTENT:
+            return RouteResult(FALLBACK_INTENT, None, self.fallback_human_needed)
+        spec = self.intents[name]
+        return RouteResult(name, spec["reply"], spec["human_needed"])
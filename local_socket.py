@@ -0,0 +1,59 @@
+# local_socket.py
+# Unix-socket listener shared by inference_server.py and the pubsub relay (pubsub.py).
+# multiprocessing.connection unpickles every message it receives, so anything that can connect
+# could run code in the listening process. Both listeners therefore:
+#   - refuse to start without an authkey: the HMAC handshake runs before anything is unpickled
+#   - create the socket 0o600 in a directory only this user can enter (0o700, owned by us)
+# Clients need the same authkey (require_authkey) — they unpickle the replies.
+import logging
+import os
+import tempfile
+import threading
+from multiprocessing.connection import Listener
+
+log = logging.getLogger(__name__)
+
+SOCKET_DIR = os.path.join(tempfile.gettempdir(), f"ruric-{os.getuid()}")
+
+
+def default_socket(name):
+    return os.path.join(SOCKET_DIR, name)
+
+
+def require_authkey(value, setting):
+    """`value` (from the environment) as bytes; RuntimeError naming `setting` when it is empty."""
+    if isinstance(value, str):
+        value = value.encode()
+    if not value:
+        raise RuntimeError(f"{setting} must be set: the socket carries pickles and is only safe behind an authkey")
+    return value
+
+
+def _private_dir(directory):
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    st = os.stat(directory)
+    if st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise RuntimeError(f"socket directory {directory} must be owned by this user with mode 0700")
+
+
+def serve(address, authkey, handler, name):
+    """Listen on `address`; every authenticated connection gets handler(conn) on its own thread."""
+    authkey = require_authkey(authkey, f"the {name} authkey")
+    _private_dir(os.path.dirname(os.path.abspath(address)))
+    if os.path.exists(address):
+        os.remove(address)  # stale socket from a previous run
+    umask = os.umask(0o177)  # the socket file is created 0o600, never briefly wider
+    try:
+        listener = Listener(address, family="AF_UNIX", authkey=authkey)
+    finally:
+        os.umask(umask)
+    with listener:
+        os.chmod(address, 0o600)
+        log.info("%s listening on %s (pid %d)", name, address, os.getpid())
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:  # e.g. a client failed the authkey handshake
+                log.warning("rejected %s client: %s", name, e)
+                continue
+            threading.Thread(target=handler, args=(conn,), daemon=True).start()
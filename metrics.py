@@ -0,0 +1,235 @@
+# metrics.py
+# In-process counters, gauges and histograms, rendered in the Prometheus text format for
+# /metrics. Recording is a lock + a couple of additions, cheap enough for every match stage
+# and every DB call. Each gunicorn worker keeps (and exposes) its own numbers.
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# seconds; from sub-millisecond rule matches up to model generations
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in pairs) + "}"
+
+
+def _num(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # label values tuple -> value / state
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines += self._render_samples()
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=(), fn=None):
+        super().__init__(name, help, labelnames)
+        # optional callable read at scrape time: {label value (tuple for several labels): count},
+        # for objects that already keep their own running totals
+        self.fn = fn
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _render_samples(self):
+        if self.fn is not None:
+            try:
+                items = sorted((k if isinstance(k, tuple) else (k,), v) for k, v in self.fn().items())
+            except Exception:
+                return []  # a broken callback must not break the whole scrape
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return [f"{self.name}_total{_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=(), fn=None):
+        super().__init__(name, help, labelnames)
+        self.fn = fn  # optional callable read at scrape time (label-less gauges only)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _render_samples(self):
+        if self.fn is not None:
+            try:
+                return [f"{self.name} {_num(self.fn())}"]
+            except Exception:
+                return []  # a broken callback must not break the whole scrape
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket counts (last slot = above the largest bucket), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_samples(self):
+        with self._lock:
+            items = sorted((k, (list(s[0]), s[1], s[2])) for k, s in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _num(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_num(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing  # re-imported module / app factory called twice
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help, labelnames=(), fn=None):
+        return self._add(Counter(name, help, labelnames, fn))
+
+    def gauge(self, name, help, labelnames=(), fn=None):
+        return self._add(Gauge(name, help, labelnames, fn))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# ---- DB-API timing proxies: every execute / fetch / commit lands in one histogram ----
+def _timed_call(seconds, errors, labels, op, fn, *args):
+    started = time.perf_counter()
+    try:
+        return fn(*args)
+    except Exception:
+        errors.inc(op=op, **labels)
+        raise
+    finally:
+        seconds.observe(time.perf_counter() - started, op=op, **labels)
+
+
+class TimedCursor:
+    def __init__(self, cursor, seconds, errors, labels):
+        self._cursor = cursor
+        self._seconds = seconds
+        self._errors = errors
+        self._labels = labels
+
+    def _timed(self, op, fn, *args):
+        return _timed_call(self._seconds, self._errors, self._labels, op, fn, *args)
+
+    def execute(self, query, args=None):
+        # label by statement verb (select / insert / update / set ...)
+        op = query.lstrip().split(None, 1)[0].lower() if query.strip() else "empty"
+        return self._timed(op, self._cursor.execute, query, args)
+
+    def executemany(self, query, args):
+        op = query.lstrip().split(None, 1)[0].lower() + "_many"
+        return self._timed(op, self._cursor.executemany, query, args)
+
+    def fetchone(self):
+        return self._timed("fetch", self._cursor.fetchone)
+
+    def fetchall(self):
+        return self._timed("fetch", self._cursor.fetchall)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+class TimedConnection:
+    def __init__(self, conn, seconds, errors, **labels):
+        self._conn = conn
+        self._seconds = seconds
+        self._errors = errors
+        self._labels = labels
+
+    def cursor(self, *args):
+        return TimedCursor(self._conn.cursor(*args), self._seconds, self._errors, self._labels)
+
+    def commit(self):
+        return _timed_call(self._seconds, self._errors, self._labels, "commit", self._conn.commit)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
@@ -0,0 +1,15 @@
+-- 001_chat_logs_conversation_key.sql
+-- Normalized conversation key on chat_logs so a conversation's history is one index range
+-- scan instead of an OR over (sender_id, receiver_id) in both directions.
+--   conversation_key = '<smaller user id>:<larger user id>'  (same for both directions;
+--   app.py's conversation_key() builds the identical string)
+-- History pages are read by (conversation_key, chat_id) with keyset pagination
+-- (?limit / ?before_id / ?after_id), so a page costs the same no matter how long the
+-- conversation is. Assumes chat_logs' AUTO_INCREMENT primary key is `chat_id`.
+--
+--   mysql ruri_club < migrations/001_chat_logs_conversation_key.sql
+
+ALTER TABLE chat_logs
+    ADD COLUMN conversation_key VARCHAR(41)
+        AS (CONCAT(LEAST(sender_id, receiver_id), ':', GREATEST(sender_id, receiver_id))) STORED,
+    ADD INDEX idx_chat_logs_conversation (conversation_key, chat_id);
@@ -0,0 +1,43 @@
+-- 002_conversations.sql
+-- One summary row per conversation (read model for the employee inbox): last message, last
+-- activity and an unread count for each side. app.py upserts it in the same transaction as
+-- every chat_logs insert (chat_log_writer.insert_chat_logs), so GET /employee/<id>/inbox is a
+-- single query instead of one history request per assigned client.
+--   user_low / user_high = the two participants, smaller id first (conversation_key order)
+--   unread_low / unread_high = messages the low / high user has not read yet
+-- System notes ("System: ...") don't count: they are not shown as last message or unread.
+-- Requires 001 (chat_logs.conversation_key).
+--
+--   mysql ruri_club < migrations/002_conversations.sql
+
+CREATE TABLE IF NOT EXISTS conversations (
+    conversation_key VARCHAR(41) NOT NULL,
+    user_low INT NOT NULL,
+    user_high INT NOT NULL,
+    last_message TEXT,
+    last_sender_id INT,
+    last_chat_type VARCHAR(32),
+    last_activity_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    unread_low INT NOT NULL DEFAULT 0,
+    unread_high INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (conversation_key),
+    KEY idx_conversations_low (user_low, last_activity_at),
+    KEY idx_conversations_high (user_high, last_activity_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- the inbox reads an employee's assignments by employee_id
+ALTER TABLE client_assignments ADD INDEX idx_client_assignments_employee (employee_id, assigned_at);
+
+-- backfill from existing history: latest non-system message per conversation, nothing unread
+INSERT INTO conversations (conversation_key, user_low, user_high, last_message, last_sender_id,
+                           last_chat_type, last_activity_at)
+SELECT c.conversation_key, LEAST(c.sender_id, c.receiver_id), GREATEST(c.sender_id, c.receiver_id),
+       c.message, c.sender_id, c.chat_type, c.created_at
+FROM chat_logs c
+JOIN (
+    SELECT conversation_key, MAX(chat_id) AS chat_id
+    FROM chat_logs
+    WHERE chat_type <> 'system' AND message NOT LIKE 'System:%'
+    GROUP BY conversation_key
+) latest ON latest.chat_id = c.chat_id
+ON DUPLICATE KEY UPDATE conversation_key = conversations.conversation_key;
@@ -0,0 +1,9 @@
+-- 003_admin_summary_indexes.sql
+-- Indexes for the admin summary recount (summary_counters.COUNT_SQL), which runs in the
+-- background every ADMIN_SUMMARY_REFRESH_SECONDS per worker: role counts and today's
+-- attendance become index range counts instead of full table scans.
+--
+--   mysql ruri_club < migrations/003_admin_summary_indexes.sql
+
+ALTER TABLE users ADD INDEX idx_users_role (role);
+ALTER TABLE attendance ADD INDEX idx_attendance_date_status (date, status);
@@ -0,0 +1,60 @@
+# model_compile.py
+# Start-up work for the fallback model, run once by nlp_model.load_model():
+#   - optional torch.compile of the decoder forward pass (MODEL_COMPILE=1): generate() keeps
+#     its Python loop, but each step runs one compiled graph instead of hundreds of small eager
+#     ops, which is where most per-token time goes on CPU for a model this size
+#   - the compiled model is only kept if its greedy output matches eager output token for token
+#     on a fixed prompt set; on a mismatch or any compile error the eager forward is restored
+#   - warm-up generations so the first real request doesn't pay for allocator growth, lazy init
+#     or graph compilation. nlp_model passes an `exercise` callable that runs the real request
+#     paths (_generate_batch with one row and with a padded batch, _generate_single for a first
+#     turn and for a turn continued from past_key_values), so the compiled graphs and their
+#     guards match what requests do and nothing recompiles after the model reports ready
+# torch is imported inside the functions, like everywhere else in the model path.
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+# short, medium and long messages like the ones that miss the rules and the FAQ
+WARMUP_PROMPTS = (
+    "hello",
+    "can you recommend something for a gift?",
+    "i ordered last week and i still have not received anything, can you check what happened",
+)
+WARMUP_NEW_TOKENS = 8
+
+
+def warm_up(exercise):
+    """Run every request path once; returns the seconds it took."""
+    started = time.monotonic()
+    exercise()
+    return time.monotonic() - started
+
+
+def compile_model(mdl, exercise, mode="default"):
+    """torch.compile `mdl.forward` in place, verified against eager → "compiled" or why it stayed eager.
+
+    `exercise()` runs the real generation paths and returns their outputs. It runs once in
+    eager mode for the reference, then twice compiled: the first compiled run compiles every
+    path, the second must hit those graphs unchanged (and still match eager output).
+    """
+    import torch
+
+    eager_forward = mdl.forward
+    expected = exercise()
+    try:
+        # dynamic shapes: prompt length, batch size and cache length change on every request
+        mdl.forward = torch.compile(eager_forward, mode=mode, dynamic=True)
+        runs = [exercise(), exercise()]
+    except Exception as e:
+        mdl.forward = eager_forward
+        log.warning("torch.compile failed, keeping the eager model: %s", e)
+        return "eager (compile failed)"
+    for actual in runs:
+        for i, (want, got) in enumerate(zip(expected, actual)):
+            if want != got:
+                mdl.forward = eager_forward
+                log.warning("compiled model disagrees with eager output (warm-up call %d); keeping the eager model", i)
+                return "eager (output mismatch)"
+    return "compiled"
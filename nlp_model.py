@@ -1,86 +1,640 @@
+import logging
 import os
-import pandas as pd
-from transformers import AutoModelForCausalLM, AutoTokenizer
-import torch
-import re
+import threading
+import time
+from intent_router import RouteResult, FAQ_INTENT, FALLBACK_INTENT
+from faq_store import FaqStore
+from response_cache import ResponseCache, normalize_message
+from inference_batcher import GenerationBatcher
+from generation_budget import DeadlineCriteria, COMPLETE, PARTIAL, TIMEOUT, CACHED, UNAVAILABLE
+from inference_client import InferenceClient, InferenceUnavailable
+from local_socket import require_authkey
+from conversation_state import ConversationStore, ConversationState, cache_nbytes
+from metrics import REGISTRY
+from model_compile import compile_model, warm_up, WARMUP_PROMPTS, WARMUP_NEW_TOKENS
+
+log = logging.getLogger(__name__)
+
+# =============================
+#  FAQ store: Excel sheet + intents.yaml compiled into one index (intent router + TF-IDF),
+#  cached as a binary snapshot and hot-reloaded when either file changes
+# =============================
+FILE_PATH = os.getenv("FAQ_FILE_PATH", os.path.join(os.path.dirname(__file__), "RuriChatbox_Responses.xlsx"))
+INTENTS_PATH = os.path.join(os.path.dirname(__file__), "intents.yaml")
+FAQ_SIMILARITY_THRESHOLD = float(os.getenv("FAQ_SIMILARITY_THRESHOLD", "0.45"))
+# max edit distance for typo-tolerant FAQ matching (0 = off)
+FAQ_FUZZY_DISTANCE = int(os.getenv("FAQ_FUZZY_DISTANCE", "2"))
+
+FAQ_STORE = FaqStore(
+    FILE_PATH,
+    INTENTS_PATH,
+    snapshot_dir=os.getenv("FAQ_SNAPSHOT_DIR", os.path.join(os.path.dirname(__file__), ".faq_cache")),
+    poll_interval=float(os.getenv("FAQ_RELOAD_INTERVAL", "5")),
+)
+FAQ_STORE.load()
+
+
+def faq_index():
+    # the live FaqIndex(responses, router, retriever, ...) — read once per request
+    return FAQ_STORE.current()
+
 
 # =============================
-#  Load Excel responses
+#  Load fallback AI model — lazily / on a background thread so Flask can serve
+#  rule + FAQ answers while torch and DialoGPT warm up
 # =============================
-FILE_PATH = os.path.join(os.path.dirname(__file__), "RuriChatbox_Responses.xlsx")
-FAQ_RESPONSES = {}
+MODEL_NAME = os.getenv("MODEL_NAME", "microsoft/DialoGPT-small")
+# background: start loading at app startup | lazy: on the first fallback | off: never
+# preload: load synchronously at app startup (gunicorn.conf.py: once in the master, shared by workers)
+MODEL_LOAD = os.getenv("MODEL_LOAD", "background").lower()
+# fp32: stock weights | int8: dynamic int8 quantization of the linear layers (CPU)
+MODEL_PRECISION = os.getenv("MODEL_PRECISION", "fp32").lower()
+# 1: torch.compile the decoder forward pass (checked against eager output, eager on mismatch)
+MODEL_COMPILE = os.getenv("MODEL_COMPILE", "0") == "1"
+MODEL_COMPILE_MODE = os.getenv("MODEL_COMPILE_MODE", "default")
+# 1: run representative generations at load time so the first request isn't the slow one
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1") == "1"
+
+# optional shared inference process (see inference_server.py): when set, this process never
+# loads the model and sends fallback generations over the Unix socket instead; the socket
+# carries pickles, so it is never used without the server's INFERENCE_AUTHKEY
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET", "")
+INFERENCE = None
+if INFERENCE_SOCKET:
+    INFERENCE = InferenceClient(INFERENCE_SOCKET, require_authkey(os.getenv("INFERENCE_AUTHKEY", ""), "INFERENCE_AUTHKEY"))
+
+tokenizer = model = None
+MODEL_STATE = {"status": "not_started", "error": None, "load_seconds": None, "compile": "off", "warmup_seconds": None}
+_model_lock = threading.Lock()  # held by load_model() for the whole load + warm-up
+_warmup_lock = threading.Lock()  # only guards starting the warm-up thread; never held while loading
+_warmup_thread = None
+
+
+def quantize_int8(mdl):
+    """Dynamic int8 quantization for CPU inference: weights stored as int8, activations quantized per batch."""
+    import torch
+    from transformers.pytorch_utils import Conv1D
+
+    # GPT-2 style models use Conv1D (y = x @ W + b) for attention/MLP; swap them for
+    # equivalent nn.Linear so quantize_dynamic picks them up along with lm_head
+    for parent in list(mdl.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, Conv1D):
+                nx, nf = child.weight.shape
+                linear = torch.nn.Linear(nx, nf)
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                setattr(parent, name, linear)
+    return torch.ao.quantization.quantize_dynamic(mdl, {torch.nn.Linear}, dtype=torch.qint8)
+
 
-try:
-    df = pd.read_excel(FILE_PATH)
-    question_col = df.columns[0]
-    answer_col = df.columns[1]
-    FAQ_RESPONSES = {
-        str(row[question_col]).strip().lower(): str(row[answer_col]).strip()
-        for _, row in df.iterrows()
-        if pd.notna(row[question_col]) and pd.notna(row[answer_col])
+def load_model():
+    """Load tokenizer + model synchronously (idempotent). Returns True when the model is usable."""
+    global tokenizer, model
+    with _model_lock:
+        if MODEL_STATE["status"] in ("ready", "failed"):
+            return MODEL_STATE["status"] == "ready"
+        MODEL_STATE["status"] = "loading"
+        started = time.monotonic()
+        try:
+            # heavy imports live here so importing nlp_model stays cheap
+            from transformers import AutoModelForCausalLM, AutoTokenizer
+            tok = AutoTokenizer.from_pretrained(MODEL_NAME)
+            mdl = AutoModelForCausalLM.from_pretrained(MODEL_NAME)
+            mdl.eval()
+            if MODEL_PRECISION == "int8":
+                mdl = quantize_int8(mdl)
+            # installed before the warm-up runs the real generation paths on them; requests
+            # still skip the model until the status says ready
+            tokenizer, model = tok, mdl
+            warm_started = time.monotonic()
+            if MODEL_COMPILE:
+                # compiling + verifying runs every generation path already
+                MODEL_STATE["compile"] = compile_model(mdl, _exercise_generation_paths, MODEL_COMPILE_MODE)
+            elif MODEL_WARMUP:
+                warm_up(_exercise_generation_paths)
+            if MODEL_COMPILE or MODEL_WARMUP:
+                MODEL_STATE["warmup_seconds"] = round(time.monotonic() - warm_started, 3)
+            MODEL_STATE["status"] = "ready"
+            log.info("DialoGPT ready (%s, %s, %.1fs)", MODEL_PRECISION, MODEL_STATE["compile"],
+                     time.monotonic() - started)
+        except Exception as e:
+            tokenizer = model = None
+            MODEL_STATE.update(status="failed", error=str(e))
+            log.warning("Could not load fallback model: %s", e)
+        MODEL_STATE["load_seconds"] = round(time.monotonic() - started, 3)
+        return MODEL_STATE["status"] == "ready"
+
+
+def start_model_warmup():
+    """Kick off load_model() on a daemon thread; returns immediately (MODEL_LOAD=preload: loads inline)."""
+    global _warmup_thread
+    if MODEL_LOAD == "off" or INFERENCE is not None:
+        return
+    if MODEL_LOAD == "preload":
+        # no thread: a thread started before fork would not exist in the workers
+        load_model()
+        return
+    # MODEL_LOAD=lazy calls this on every fallback request: once the thread exists, return
+    # without touching any lock so requests get the default reply while the model loads
+    if _warmup_thread is not None:
+        return
+    with _warmup_lock:
+        if _warmup_thread is not None or MODEL_STATE["status"] != "not_started":
+            return
+        MODEL_STATE["status"] = "loading"
+        _warmup_thread = threading.Thread(target=load_model, name="model-warmup", daemon=True)
+        _warmup_thread.start()
+
+
+def model_ready():
+    return MODEL_STATE["status"] == "ready"
+
+
+def readiness():
+    """Which response stages can answer right now (for /health/ready)."""
+    index = faq_index()
+    if INFERENCE is not None:
+        remote = INFERENCE.status()
+        return {
+            "rules": True,
+            "faq": len(index.responses) > 0,
+            "semantic_faq": len(index.retriever) > 0,
+            "faq_store": FAQ_STORE.stats(),
+            "model": remote.get("model"),
+            "model_name": remote.get("model_name"),
+            "model_precision": remote.get("model_precision"),
+            "model_compile": remote.get("model_compile"),
+            "model_error": remote.get("error"),
+            "inference_server": INFERENCE.address,
+        }
+    return {
+        "rules": True,
+        "faq": len(index.responses) > 0,
+        "semantic_faq": len(index.retriever) > 0,
+        "faq_store": FAQ_STORE.stats(),
+        "model": MODEL_STATE["status"],
+        "model_name": MODEL_NAME,
+        "model_precision": MODEL_PRECISION,
+        "model_error": MODEL_STATE["error"],
+        "model_load_seconds": MODEL_STATE["load_seconds"],
+        "model_compile": MODEL_STATE["compile"],
+        "model_warmup_seconds": MODEL_STATE["warmup_seconds"],
     }
-    print(f"✅ Excel loaded: {len(FAQ_RESPONSES)} rows")
-except Exception as e:
-    print("⚠ Excel load error:", e)
+
+
+# =============================
+#  Fallback reply cache (LRU + TTL) — repeated "thanks" / "ok" skip model.generate
+# =============================
+FALLBACK_CACHE = ResponseCache(
+    maxsize=int(os.getenv("FALLBACK_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("FALLBACK_CACHE_TTL", "3600")),
+)
+
+
+def invalidate_fallback_cache(*_):
+    # called whenever the FAQ sheet changes so stale AI replies aren't served
+    FALLBACK_CACHE.invalidate()
+
+
+FAQ_STORE.on_reload(invalidate_fallback_cache)
+
+
+# =============================
+#  Generation budget — replies are capped by max_new_tokens AND a wall-clock deadline
+# =============================
+GENERATION_MAX_NEW_TOKENS = int(os.getenv("GENERATION_MAX_NEW_TOKENS", "64"))
+GENERATION_DEADLINE_MS = float(os.getenv("GENERATION_DEADLINE_MS", "3000"))
+
+
+def _context_limit():
+    # position-embedding size: prompt + reply tokens can never exceed it
+    return getattr(model.config, "n_positions", None) or getattr(model.config, "max_position_embeddings", 1024)
+
+
+def _budget(max_new_tokens, deadline_ms):
+    # → (max_new_tokens, absolute monotonic deadline)
+    max_new_tokens = max(1, int(max_new_tokens or GENERATION_MAX_NEW_TOKENS))
+    deadline_ms = GENERATION_DEADLINE_MS if deadline_ms is None else float(deadline_ms)
+    return max_new_tokens, time.monotonic() + deadline_ms / 1000.0
+
+
+# =============================
+#  Batched generation — concurrent fallbacks share one left-padded model.generate call
+# =============================
+def _generate_batch(requests):
+    # requests: [(prompt, max_new_tokens, deadline), ...] → [(reply, generation), ...]
+    import torch
+    results = [("", TIMEOUT)] * len(requests)
+    # requests whose deadline already passed while queued are not worth generating
+    live = [i for i, (_, _, deadline) in enumerate(requests) if deadline > time.monotonic()]
+    if not live:
+        return results
+
+    pad_id = tokenizer.eos_token_id
+    encoded = [tokenizer.encode(requests[i][0] + tokenizer.eos_token) for i in live]
+    width = max(len(ids) for ids in encoded)
+    input_ids = torch.tensor([[pad_id] * (width - len(ids)) + ids for ids in encoded])
+    attention_mask = torch.tensor([[0] * (width - len(ids)) + [1] * len(ids) for ids in encoded])
+    budgets = [max(1, min(requests[i][1], _context_limit() - width)) for i in live]
+    criteria = DeadlineCriteria([requests[i][2] for i in live], width, pad_id)
+
+    with torch.no_grad():
+        outputs = model.generate(
+            input_ids,
+            attention_mask=attention_mask,
+            max_new_tokens=max(budgets),
+            pad_token_id=pad_id,
+            stopping_criteria=[criteria],
+        )
+    # decode only the generated tokens (not the echoed prompt), cut to each request's budget
+    for row_no, (i, row, budget) in enumerate(zip(live, outputs, budgets)):
+        text = tokenizer.decode(row[width:width + budget], skip_special_tokens=True).strip()
+        if row_no in criteria.timed_out:
+            results[i] = (text, PARTIAL if text else TIMEOUT)
+        else:
+            results[i] = (text, COMPLETE)
+    return results
+
+
+BATCHER = GenerationBatcher(
+    _generate_batch,
+    max_batch=int(os.getenv("GENERATION_MAX_BATCH", "8")),
+    max_wait_ms=float(os.getenv("GENERATION_MAX_WAIT_MS", "10")),
+)
+
+
+# =============================
+#  Multi-turn context — per-sender token history + KV cache, so follow-ups only encode new tokens
+# =============================
+CONVERSATION_CONTEXT = os.getenv("CONVERSATION_CONTEXT", "1") == "1"
+# history kept per conversation (tokens); older turns are dropped once it grows past this
+CONVERSATION_MAX_TOKENS = int(os.getenv("CONVERSATION_MAX_TOKENS", "256"))
+CONVERSATIONS = ConversationStore(
+    max_sessions=int(os.getenv("CONVERSATION_MAX_SESSIONS", "1000")),
+    max_bytes=int(float(os.getenv("CONVERSATION_MAX_MB", "256")) * 1024 * 1024),
+)
+
+
+def _generate_single(prompt, max_new_tokens, deadline, sender_id=None, streamer=None):
+    """One unbatched generation → (reply, generation). With a sender_id the reply continues
+    that conversation, reusing its past_key_values when they still match the history."""
+    import torch
+
+    use_context = CONVERSATION_CONTEXT and sender_id is not None
+    state = CONVERSATIONS.take(sender_id) if use_context else None
+    new_ids = tokenizer.encode(prompt + tokenizer.eos_token)
+    history, past = (state.history, state.past) if state else ([], None)
+
+    input_ids = history + new_ids
+    window = min(CONVERSATION_MAX_TOKENS, _context_limit() - max_new_tokens)
+    if len(input_ids) > max(window, len(new_ids)):
+        # dropping old turns shifts every position, so the cached keys/values are useless now
+        input_ids = input_ids[-max(window, len(new_ids)):]
+        past = None
+    width = len(input_ids)
+
+    criteria = DeadlineCriteria([deadline], width, tokenizer.eos_token_id)
+    ids = torch.tensor([input_ids])
+    with torch.no_grad():
+        out = model.generate(
+            ids,
+            attention_mask=torch.ones_like(ids),
+            max_new_tokens=max(1, min(max_new_tokens, _context_limit() - width)),
+            pad_token_id=tokenizer.eos_token_id,
+            stopping_criteria=[criteria],
+            past_key_values=past,
+            use_cache=True,
+            return_dict_in_generate=True,
+            streamer=streamer,
+        )
+    sequence = out.sequences[0].tolist()
+    text = tokenizer.decode(sequence[width:], skip_special_tokens=True).strip()
+    generation = (PARTIAL if text else TIMEOUT) if criteria.timed_out else COMPLETE
+
+    if use_context:
+        if sequence[-1] != tokenizer.eos_token_id:
+            # close the bot turn; the cache still covers a prefix of the history, which is fine
+            sequence.append(tokenizer.eos_token_id)
+        past = out.past_key_values
+        CONVERSATIONS.put(sender_id, ConversationState(sequence, past, cache_nbytes(past) + len(sequence) * 8))
+    return text, generation
+
+
+def has_context(sender_id):
+    """True when this sender's next fallback continues a stored conversation. Only those turns
+    bypass the shared reply cache and the batcher; a first turn (no history yet) uses both."""
+    if not CONVERSATION_CONTEXT or sender_id is None:
+        return False
+    if INFERENCE is not None:
+        try:
+            return INFERENCE.has_context(sender_id)
+        except InferenceUnavailable:
+            return False
+    return sender_id in CONVERSATIONS
+
+
+def remember_turn(sender_id, prompt, reply):
+    # a turn answered by the batcher or the reply cache still becomes the sender's context
+    # (history only; the next turn encodes it once and keeps the KV cache from then on)
+    if not CONVERSATION_CONTEXT or sender_id is None or not reply:
+        return
+    if INFERENCE is not None:
+        try:
+            INFERENCE.remember_turn(sender_id, prompt, reply)
+        except InferenceUnavailable:
+            pass
+        return
+    history = tokenizer.encode(prompt + tokenizer.eos_token) + tokenizer.encode(reply + tokenizer.eos_token)
+    CONVERSATIONS.put(sender_id, ConversationState(history, None, len(history) * 8))
+
+
+def _exercise_generation_paths():
+    """Run every model.generate call shape requests use → their outputs (warm-up, compile check):
+    one-row and padded batches through _generate_batch, then a first and a continued turn
+    (past_key_values reused) through _generate_single."""
+    deadline = time.monotonic() + 600.0  # the warm-up must never be cut short by the deadline
+    outputs = _generate_batch([(WARMUP_PROMPTS[0], WARMUP_NEW_TOKENS, deadline)])
+    outputs += _generate_batch([(p, WARMUP_NEW_TOKENS, deadline) for p in WARMUP_PROMPTS])
+    sender_id = ("warm-up", threading.get_ident())
+    try:
+        outputs.append(_generate_single(WARMUP_PROMPTS[1], WARMUP_NEW_TOKENS, deadline, sender_id))
+        outputs.append(_generate_single(WARMUP_PROMPTS[2], WARMUP_NEW_TOKENS, deadline, sender_id))
+    finally:
+        CONVERSATIONS.drop(sender_id)
+    return outputs
+
+
+def reset_conversation(sender_id):
+    # forget a sender's multi-turn context (e.g. when they are handed to a live agent)
+    if INFERENCE is not None:
+        try:
+            INFERENCE.reset(sender_id)
+        except InferenceUnavailable:
+            pass
+        return
+    CONVERSATIONS.drop(sender_id)
+
+
+def generate_reply(prompt, max_new_tokens, deadline, sender_id=None):
+    """Run one fallback generation → (reply, generation).
+
+    Remote inference server if configured, else in-process: in the sender's conversation
+    context when that sender has one, otherwise through the cross-request batcher (and the
+    turn then starts the sender's context).
+    """
+    if INFERENCE is not None:
+        try:
+            return INFERENCE.generate(prompt, max_new_tokens, deadline, sender_id)
+        except InferenceUnavailable as e:
+            log.warning("Inference server unavailable: %s", e)
+            return "", UNAVAILABLE
+    if has_context(sender_id):
+        return _generate_single(prompt, max_new_tokens, deadline, sender_id)
+    try:
+        reply, generation = BATCHER.submit((prompt, max_new_tokens, deadline),
+                                           timeout=max(0.0, deadline - time.monotonic()) + 1.0)
+    except TimeoutError:
+        return "", TIMEOUT
+    remember_turn(sender_id, prompt, reply)
+    return reply, generation
+
+
+def _failed_generation(generation):
+    # label for the default reply when generation gave no usable text
+    if generation in (None, COMPLETE):
+        return None
+    return TIMEOUT if generation == PARTIAL else generation
+
 
 # =============================
-#  Load fallback AI model
+#  Streaming generation — tokens are handed out as model.generate produces them
 # =============================
-try:
-    MODEL_NAME = "microsoft/DialoGPT-small"
-    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-    model = AutoModelForCausalLM.from_pretrained(MODEL_NAME)
-    print("✅ DialoGPT ready")
-except Exception as e:
-    tokenizer = model = None
-    print("⚠ Could not load fallback model:", e)
+def _stream_generate(prompt, max_new_tokens, deadline, status, sender_id=None):
+    # yields text chunks; sets status["generation"] once generation has stopped
+    from transformers import TextIteratorStreamer
+
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+
+    def run():
+        try:
+            with STAGE_SECONDS.time(stage="model_stream"):
+                status["generation"] = _generate_single(prompt, max_new_tokens, deadline, sender_id, streamer)[1]
+        except Exception:
+            log.exception("Streaming generation failed")
+            status["generation"] = TIMEOUT
+            streamer.end()  # unblock the consumer
+
+    worker = threading.Thread(target=run, name="generate-stream", daemon=True)
+    worker.start()
+    for text in streamer:
+        if text:
+            yield text
+    worker.join()  # status + conversation state are written after the last token
+
+
+class ReplyStream:
+    """Iterate for reply chunks; once exhausted, `.result` holds the full RouteResult."""
+
+    def __init__(self, chunks, intent, human_needed, generation=None, status=None, on_complete=None):
+        self._chunks = chunks
+        self._on_complete = on_complete
+        self._status = status if status is not None else {"generation": generation}
+        self.intent = intent
+        self.human_needed = human_needed
+        self.parts = []
+        self.result = None
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            self.parts.append(chunk)
+            yield chunk
+        reply = "".join(self.parts).strip()
+        generation = self._status.get("generation")
+        if not reply:
+            # the model produced nothing usable → same default answer as nlp_model_route
+            fallback = _default_fallback(_failed_generation(generation))
+            self.intent, self.human_needed, generation = fallback.intent, fallback.human_needed, fallback.generation
+            self.parts.append(fallback.reply)
+            reply = fallback.reply
+            yield fallback.reply
+        elif self._on_complete and generation == COMPLETE:
+            self._on_complete(reply)
+        self.result = RouteResult(self.intent, reply, self.human_needed, generation)
+        RESPONSES.inc(intent=self.intent, generation=generation or "", mode="stream")
+
+
+# =============================
+#  Metrics — latency per response stage + outcome counters (exported by app.py at /metrics)
+# =============================
+STAGE_SECONDS = REGISTRY.histogram("ruric_nlp_stage_seconds", "Time spent in each response stage", ["stage"])
+ROUTE_SECONDS = REGISTRY.histogram("ruric_nlp_route_seconds", "End-to-end nlp_model_route latency", ["intent"])
+RESPONSES = REGISTRY.counter("ruric_nlp_responses", "Answered messages by intent and generation outcome",
+                             ["intent", "generation", "mode"])
+REGISTRY.gauge("ruric_model_ready", "1 once the fallback model is loaded", fn=lambda: int(model_ready()))
+REGISTRY.gauge("ruric_faq_questions", "Questions in the live FAQ index", fn=lambda: FAQ_STORE.stats()["questions"])
+REGISTRY.gauge("ruric_fallback_cache_entries", "Entries in the fallback reply cache",
+               fn=lambda: FALLBACK_CACHE.stats()["size"])
+# hit rate = rate(hits) / (rate(hits) + rate(misses))
+CACHE_EVENTS = ("hits", "misses", "evictions", "expirations", "invalidations")
+REGISTRY.counter("ruric_fallback_cache_events", "Fallback reply cache lookups (hits / misses) and removals",
+                 ["event"], fn=lambda: {event: FALLBACK_CACHE.stats()[event] for event in CACHE_EVENTS})
+REGISTRY.gauge("ruric_conversation_sessions", "Conversations holding multi-turn model context",
+               fn=lambda: len(CONVERSATIONS))
+
 
 # =============================
 #  NLP Response Function
 # =============================
-def nlp_model_respond(user_message, max_length=150):
+def _match_rules_and_faq(user_input, index):
+    # 1️⃣–5️⃣ help / emotional / greeting / exact FAQ / partial FAQ in a single scan
+    with STAGE_SECONDS.time(stage="router"):
+        result = index.router.route(user_input)
+    if result.intent != FALLBACK_INTENT:
+        log.debug("Matched: %s", result.intent)
+        return result
+
+    # 5️⃣½ Typos: a near-exact FAQ question
+    with STAGE_SECONDS.time(stage="fuzzy"):
+        question = index.fuzzy.lookup(user_input, FAQ_FUZZY_DISTANCE)
+    if question is not None:
+        log.debug("Matched: fuzzy FAQ (%r)", question)
+        return RouteResult(FAQ_INTENT, index.responses[question], index.router.faq_human_needed)
+
+    # 6️⃣ Semantic FAQ match (paraphrased questions)
+    with STAGE_SECONDS.time(stage="semantic"):
+        hit = index.retriever.best(user_input, FAQ_SIMILARITY_THRESHOLD)
+    if hit:
+        question, answer, score = hit
+        log.debug("Matched: semantic FAQ (%.2f -> %r)", score, question)
+        return RouteResult(FAQ_INTENT, answer, index.router.faq_human_needed)
+
+    # 6️⃣½ Misspelled words fixed: only an FAQ hit counts — the intent router never sees the
+    # corrected text, so a correction can't turn "late" into an emotional "hate"
+    with STAGE_SECONDS.time(stage="fuzzy"):
+        corrected = index.fuzzy.correct(user_input, FAQ_FUZZY_DISTANCE)
+    if corrected == user_input.lower():
+        return None
+    question = corrected.strip() if corrected.strip() in index.responses else None
+    if question is None:
+        with STAGE_SECONDS.time(stage="fuzzy"):
+            question = index.fuzzy.lookup(corrected, FAQ_FUZZY_DISTANCE)
+    if question is not None:
+        log.debug("Matched: FAQ after spelling correction (%r -> %r)", corrected, question)
+        return RouteResult(FAQ_INTENT, index.responses[question], index.router.faq_human_needed)
+    with STAGE_SECONDS.time(stage="semantic"):
+        hit = index.retriever.best(corrected, FAQ_SIMILARITY_THRESHOLD)
+    if hit:
+        question, answer, score = hit
+        log.debug("Matched: semantic FAQ after spelling correction (%.2f -> %r)", score, question)
+        return RouteResult(FAQ_INTENT, answer, index.router.faq_human_needed)
+    return None
+
+
+def _default_fallback(generation=None):
+    log.info("Default fallback (generation: %s)", generation)
+    router = faq_index().router
+    return RouteResult(FALLBACK_INTENT, router.fallback_reply, router.fallback_human_needed, generation)
+
+
+def _model_available():
+    if INFERENCE is not None:
+        return True  # the inference server decides; if it's down we get UNAVAILABLE back
+    if MODEL_LOAD == "lazy":
+        start_model_warmup()
+    return model_ready()
+
+
+def nlp_model_route(user_message, max_new_tokens=None, deadline_ms=None, sender_id=None):
+    """Classify the message and answer it; returns RouteResult(intent, reply, human_needed, generation).
+
+    The AI fallback generates at most `max_new_tokens` tokens and stops at `deadline_ms`
+    (measured from this call); `generation` then says whether the reply is complete, a
+    partial reply cut at the deadline, or the default live-agent text after a timeout.
+    With a `sender_id` that already has a conversation the fallback continues it (multi-turn
+    context) instead of using the shared reply cache and batcher; a first turn uses both.
+    """
+    started = time.perf_counter()
+    result = _route(user_message, max_new_tokens, deadline_ms, sender_id)
+    ROUTE_SECONDS.observe(time.perf_counter() - started, intent=result.intent)
+    RESPONSES.inc(intent=result.intent, generation=result.generation or "", mode="route")
+    return result
+
+
+def _route(user_message, max_new_tokens, deadline_ms, sender_id):
+    max_new_tokens, deadline = _budget(max_new_tokens, deadline_ms)
+    user_input = user_message.strip().lower()
+    log.debug("User asked: %s", user_input)
+
+    result = _match_rules_and_faq(user_input, faq_index())
+    if result:
+        return result
+
+    # 7️⃣ Fallback to AI model — skipped while it warms up
+    if _model_available():
+        # in-context replies depend on the conversation so far: no shared cache for them
+        in_context = has_context(sender_id)
+        cache_key = (normalize_message(user_input), max_new_tokens)
+        reply = None if in_context else FALLBACK_CACHE.get(cache_key)
+        if reply is not None:
+            log.debug("AI fallback (cached)")
+            remember_turn(sender_id, user_message, reply)
+            return RouteResult(FALLBACK_INTENT, reply, False, CACHED)
+
+        with STAGE_SECONDS.time(stage="model"):
+            reply, generation = generate_reply(user_message, max_new_tokens, deadline, sender_id)
+        if reply:
+            if generation == COMPLETE and not in_context:
+                FALLBACK_CACHE.put(cache_key, reply)
+            log.debug("AI fallback used (%s)", generation)
+            return RouteResult(FALLBACK_INTENT, reply, False, generation)
+        if generation != COMPLETE:
+            return _default_fallback(_failed_generation(generation))
+
+    # 8️⃣ Default fallback (if all else fails)
+    return _default_fallback()
+
+
+def nlp_model_stream(user_message, max_new_tokens=None, deadline_ms=None, sender_id=None):
+    """Streaming variant of nlp_model_route: rule / FAQ / cached answers arrive as one chunk,
+    AI fallback replies token by token (same token + deadline budget and sender context).
+    Returns a ReplyStream."""
+    max_new_tokens, deadline = _budget(max_new_tokens, deadline_ms)
     user_input = user_message.strip().lower()
-    print(f"🟡 User asked: {user_input}")
-
-    # 1️⃣ Help / Support detection
-    help_keywords = [
-        "help", "support", "problem", "issue", "error", "stuck",
-        "agent", "human", "representative", "staff", "i need help", "i need support"
-    ]
-    if any(k in user_input for k in help_keywords):
-        print("✅ Matched: Help / Support")
-        return "Don't worry — I’ll connect you to a live agent now."
-
-    # 2️⃣ Unrelated / Emotional topics
-    if re.search(r"\b(love|miss|like|hate|sad|angry)\b", user_input):
-        print("✅ Matched: Unrelated/Emotional")
-        return "I didn’t quite understand that — let me connect you to a live agent for better assistance."
-
-    # 3️⃣ Greeting detection
-    greetings = ["hi", "hello", "hey", "good morning", "good afternoon"]
-    if any(word == user_input for word in greetings):
-        print("✅ Matched: Greeting")
-        return "Hello! How can I help you today?"
-
-    # 4️⃣ Exact match in Excel
-    if user_input in FAQ_RESPONSES:
-        print("✅ Matched: Exact FAQ")
-        return FAQ_RESPONSES[user_input]
-
-    # 5️⃣ Partial match from Excel
-    for q, a in FAQ_RESPONSES.items():
-        if q in user_input:
-            print("✅ Matched: Partial FAQ")
-            return a
-
-    # 6️⃣ Fallback to AI model
-    if tokenizer and model:
-        inputs = tokenizer.encode(user_message + tokenizer.eos_token, return_tensors="pt")
-        outputs = model.generate(inputs, max_length=max_length, pad_token_id=tokenizer.eos_token_id)
-        reply = tokenizer.decode(outputs[0], skip_special_tokens=True)
-        print("✅ AI fallback used")
-        return reply.strip()
-
-    # 7️⃣ Default fallback (if all else fails)
-    print("⚠ Default fallback")
-    return "I'm not sure about that. Would you like me to connect you to a live agent?"
+    log.debug("User asked (stream): %s", user_input)
+
+    result = _match_rules_and_faq(user_input, faq_index())
+    if result:
+        return ReplyStream([result.reply], result.intent, result.human_needed)
+
+    if _model_available():
+        in_context = has_context(sender_id)
+        cache_key = (normalize_message(user_input), max_new_tokens)
+        reply = None if in_context else FALLBACK_CACHE.get(cache_key)
+        if reply is not None:
+            log.debug("AI fallback (cached)")
+            remember_turn(sender_id, user_message, reply)
+            return ReplyStream([reply], FALLBACK_INTENT, False, generation=CACHED)
+        if INFERENCE is not None:
+            # the inference server answers whole replies: send it as a single chunk
+            reply, generation = generate_reply(user_message, max_new_tokens, deadline, sender_id)
+            return ReplyStream([reply] if reply else [], FALLBACK_INTENT, False, generation=generation,
+                               on_complete=None if in_context else lambda text: FALLBACK_CACHE.put(cache_key, text))
+        log.debug("AI fallback streaming")
+        status = {}
+        return ReplyStream(_stream_generate(user_message, max_new_tokens, deadline, status, sender_id),
+                           FALLBACK_INTENT, False, status=status,
+                           on_complete=None if in_context else lambda text: FALLBACK_CACHE.put(cache_key, text))
+
+    result = _default_fallback()
+    return ReplyStream([result.reply], result.intent, result.human_needed)
+
+
+def nlp_model_respond(user_message, max_new_tokens=None, deadline_ms=None, sender_id=None):
+    return nlp_model_route(user_message, max_new_tokens=max_new_tokens, deadline_ms=deadline_ms,
+                           sender_id=sender_id).reply
+
+
+def faq_scores(user_message, top_k=5):
+    """Debug helper: the top_k FAQ questions by TF-IDF similarity to the message."""
+    return faq_index().retriever.top(user_message.strip().lower(), top_k)
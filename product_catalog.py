@@ -0,0 +1,154 @@
+# product_catalog.py
+# In-memory snapshot of the products table for the storefront (/products), the most-hit read:
+#   - loaded with an explicit column list, ordered newest first, serialized to JSON once per
+#     version; `version` is a digest of the rows, so it only changes when the catalog does and
+#     doubles as the strong ETag (unchanged catalog → 304 Not Modified)
+#   - revalidated in the background every `ttl` seconds like FaqStore: requests keep being
+#     served from the current snapshot while one thread reloads, and a reload whose rows are
+#     identical keeps the old version (and ETag)
+#   - products are only written outside the app (admin SQL / imports), so there is no write
+#     path to hook: a change shows up within `ttl` seconds (PRODUCTS_CACHE_TTL) in every worker
+#   - page() filters by price / stock and paginates with a keyset cursor on (created_at, product_id)
+import bisect
+import hashlib
+import json
+import logging
+import threading
+import time
+from decimal import Decimal, InvalidOperation
+
+log = logging.getLogger(__name__)
+
+PRODUCT_COLUMNS = ("product_id", "name", "description", "price", "stock", "image_url", "created_at")
+SELECT_PRODUCTS = (f"SELECT {', '.join(PRODUCT_COLUMNS)} FROM products "
+                   "ORDER BY created_at DESC, product_id DESC")
+
+
+def product_to_dict(row):
+    product = dict(zip(PRODUCT_COLUMNS, row))
+    product["price"] = str(product["price"])
+    product["created_at"] = str(product["created_at"])
+    return product
+
+
+class CatalogSnapshot:
+    def __init__(self, rows, loaded_at=None):
+        self.products = [product_to_dict(r) for r in rows]  # newest first
+        self.by_id = {p["product_id"]: p for p in self.products}
+        # the whole catalog, pre-serialized: the unfiltered /products response
+        self.body = json.dumps(self.products).encode("utf-8")
+        self.version = hashlib.sha1(self.body).hexdigest()[:20]
+        self.loaded_at = loaded_at or time.time()
+        # (created_at, product_id) in ascending order, for cursor lookups with bisect
+        self._keys = [(p["created_at"], p["product_id"]) for p in reversed(self.products)]
+        self._prices = [r[3] for r in rows]  # DECIMAL values, for the price filters
+
+    def __len__(self):
+        return len(self.products)
+
+    def page(self, limit=None, cursor=None, min_price=None, max_price=None, in_stock=False):
+        """→ (products, next_cursor or None). `cursor` is the next_cursor of the previous page."""
+        start = 0
+        if cursor:
+            created_at, _, product_id = cursor.rpartition("|")
+            # rows strictly older than the cursor row, in newest-first order
+            start = len(self._keys) - bisect.bisect_left(self._keys, (created_at, int(product_id)))
+        out = []
+        for i in range(start, len(self.products)):
+            p, price = self.products[i], self._prices[i]
+            if min_price is not None or max_price is not None:
+                if price is None or min_price is not None and price < min_price \
+                        or max_price is not None and price > max_price:
+                    continue
+            if in_stock and not p["stock"]:
+                continue
+            if limit is not None and len(out) == limit:
+                last = out[-1]
+                return out, f"{last['created_at']}|{last['product_id']}"
+            out.append(p)
+        return out, None
+
+
+def parse_price(value):
+    try:
+        return Decimal(value) if value not in (None, "") else None
+    except InvalidOperation:
+        raise ValueError(f"invalid price {value!r}")
+
+
+class ProductCatalog:
+    def __init__(self, pool=None, ttl=60.0):
+        self.pool = pool
+        self.ttl = ttl
+        self._snapshot = None
+        self._reload_lock = threading.Lock()
+        self._listeners = []
+        self.reloads = 0
+        self.reload_errors = 0
+
+    def init_app(self, app, pool):
+        self.pool = pool
+        self.ttl = float(app.config.get("PRODUCTS_CACHE_TTL", self.ttl))
+
+    # ---- public ----
+    def current(self):
+        """The live CatalogSnapshot; loads synchronously the first time, revalidates after `ttl`."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            self.reload()
+            if self._snapshot is None:
+                raise RuntimeError("product catalog could not be loaded")
+            return self._snapshot
+        if time.time() - snapshot.loaded_at >= self.ttl and not self._reload_lock.locked():
+            threading.Thread(target=self.reload, name="catalog-reload", daemon=True).start()
+        return snapshot
+
+    def on_reload(self, callback):
+        # callback(old_snapshot or None, new_snapshot) runs after every version change
+        self._listeners.append(callback)
+
+    def reload(self):
+        with self._reload_lock:
+            try:
+                snapshot = CatalogSnapshot(self._fetch())
+            except Exception as e:
+                # keep serving the old snapshot; retried after the next ttl
+                self.reload_errors += 1
+                if self._snapshot is not None:
+                    self._snapshot.loaded_at = time.time()
+                log.warning("product catalog reload failed: %s", e)
+                return False
+            old = self._snapshot
+            if old is not None and old.version == snapshot.version:
+                old.loaded_at = snapshot.loaded_at  # unchanged: same version, same ETag
+                return True
+            self._snapshot = snapshot
+            self.reloads += 1
+            for callback in self._listeners:
+                callback(old, snapshot)
+            log.info("product catalog ready: %d products (version %s)", len(snapshot), snapshot.version)
+            return True
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "products": len(snapshot) if snapshot else 0,
+            "version": snapshot.version if snapshot else None,
+            "loaded_at": snapshot.loaded_at if snapshot else None,
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+        }
+
+    # ---- internals ----
+    def _fetch(self):
+        conn = self.pool.acquire()
+        try:
+            cur = conn.cursor()
+            cur.execute(SELECT_PRODUCTS)
+            rows = cur.fetchall()
+            cur.close()
+        except Exception:
+            self.pool.release(conn, discard=True)
+            raise
+        self.pool.release(conn)
+        return rows
@@ -0,0 +1,139 @@
+# product_search.py
+# Inverted index over product name + description for /products/search (type-ahead):
+#   - term -> {product_id: (hits in name, hits in description)}, plus every term in a sorted
+#     list so a prefix ("cand" -> candle, candles, candy) is one bisect + a short scan
+#   - every query word must match (as a whole word or, for type-ahead, as a prefix); score is
+#     idf-weighted, name hits count 3x description hits, whole-word hits 2x prefix hits, and a
+#     name that starts with the query gets a bonus; ties go to the newest product
+#   - kept in sync with product_catalog snapshots through on_reload: only products whose name
+#     or description changed are re-indexed, so a reload costs O(changed products)
+# Searches never touch MySQL; they take a lock that is only held for the short index updates.
+import bisect
+import heapq
+import math
+import re
+import threading
+
+_WORD = re.compile(r"\w+")
+
+NAME_WEIGHT = 3.0
+DESCRIPTION_WEIGHT = 1.0
+PREFIX_FACTOR = 0.5  # a prefix-only hit is worth half a whole-word hit
+NAME_PREFIX_BONUS = 2.0
+MAX_PREFIX_TERMS = 64  # terms (the word itself included) per query word ("c" must not scan the whole vocabulary)
+
+
+def tokenize(text):
+    return _WORD.findall(str(text or "").lower())
+
+
+def _term_counts(product):
+    counts = {}
+    for term in tokenize(product.get("name")):
+        name_hits, desc_hits = counts.get(term, (0, 0))
+        counts[term] = (name_hits + 1, desc_hits)
+    for term in tokenize(product.get("description")):
+        name_hits, desc_hits = counts.get(term, (0, 0))
+        counts[term] = (name_hits, desc_hits + 1)
+    return counts
+
+
+class ProductSearchIndex:
+    def __init__(self):
+        self._postings = {}  # term -> {product_id: (name hits, description hits)}
+        self._terms = []  # sorted keys of _postings
+        self._indexed = {}  # product_id -> (name, description) as indexed
+        self._products = {}  # product_id -> product dict of the current snapshot
+        self._lock = threading.Lock()
+        self.version = None
+        self.updates = 0
+
+    def __len__(self):
+        return len(self._indexed)
+
+    # ---- catalog sync ----
+    def apply(self, old, new):
+        """product_catalog on_reload callback: re-index what changed between two snapshots."""
+        with self._lock:
+            for product_id in [pid for pid in self._indexed if pid not in new.by_id]:
+                self._remove(product_id)
+            for product_id, product in new.by_id.items():
+                text = (product.get("name"), product.get("description"))
+                if self._indexed.get(product_id) != text:
+                    self._remove(product_id)
+                    self._add(product_id, product, text)
+            self._products = new.by_id
+            self.version = new.version
+            self.updates += 1
+
+    def _add(self, product_id, product, text):
+        for term, hits in _term_counts(product).items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                bisect.insort(self._terms, term)
+            postings[product_id] = hits
+        self._indexed[product_id] = text
+
+    def _remove(self, product_id):
+        text = self._indexed.pop(product_id, None)
+        if text is None:
+            return
+        for term in _term_counts({"name": text[0], "description": text[1]}):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect.bisect_left(self._terms, term)]
+
+    # ---- queries ----
+    def _expand(self, word):
+        # up to MAX_PREFIX_TERMS terms starting with the word (the word itself first, if indexed)
+        i = bisect.bisect_left(self._terms, word)
+        out = []
+        while i < len(self._terms) and len(out) < MAX_PREFIX_TERMS and self._terms[i].startswith(word):
+            out.append(self._terms[i])
+            i += 1
+        return out
+
+    def search(self, query, limit=20):
+        """[(score, product dict)] best first; every query word must match."""
+        words = tokenize(query)
+        if not words:
+            return []
+        with self._lock:
+            total = len(self._indexed) or 1
+            scores = None
+            for word in words:
+                word_scores = {}
+                for term in self._expand(word):
+                    postings = self._postings[term]
+                    weight = math.log(1.0 + total / len(postings)) * (1.0 if term == word else PREFIX_FACTOR)
+                    for product_id, (name_hits, desc_hits) in postings.items():
+                        score = weight * (NAME_WEIGHT * name_hits + DESCRIPTION_WEIGHT * desc_hits)
+                        # a word counts once per product: its best-matching term
+                        if score > word_scores.get(product_id, 0.0):
+                            word_scores[product_id] = score
+                if scores is None:
+                    scores = word_scores
+                else:
+                    scores = {pid: s + word_scores[pid] for pid, s in scores.items() if pid in word_scores}
+                if not scores:
+                    return []
+            phrase = " ".join(words)
+            ranked = []
+            for product_id, score in scores.items():
+                product = self._products.get(product_id)
+                if product is None:
+                    continue
+                if " ".join(tokenize(product.get("name"))).startswith(phrase):
+                    score += NAME_PREFIX_BONUS
+                ranked.append((score, product["created_at"], product_id, product))
+        best = heapq.nlargest(limit, ranked, key=lambda r: r[:3])
+        return [(round(score, 4), product) for score, _, _, product in best]
+
+    def stats(self):
+        return {"products": len(self._indexed), "terms": len(self._terms), "version": self.version,
+                "updates": self.updates}
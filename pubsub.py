@@ -0,0 +1,235 @@
+# pubsub.py
+# Push channel for chat messages: routes publish each saved chat_logs row to its conversation
+# (and to the receiver's inbox) and SSE streams subscribed to those topics get it immediately,
+# so open chat windows don't re-poll the history endpoints.
+#
+# Fan-out is in-process by default. With several gunicorn workers a message published in one
+# worker must reach streams held by the others: run the relay below and point every worker at
+# it with PUBSUB_SOCKET; publishes then go through the relay, which echoes them to all workers.
+# The relay socket carries pickles: the relay and every worker need the same PUBSUB_AUTHKEY
+# (see local_socket.py), and neither side will use the socket without one.
+#
+#   PUBSUB_AUTHKEY=<secret> python pubsub.py           # relay on PUBSUB_SOCKET
+#   PUBSUB_AUTHKEY=<secret> PUBSUB_SOCKET=/tmp/ruric-$(id -u)/pubsub.sock gunicorn -c gunicorn.conf.py
+import argparse
+import logging
+import os
+import queue
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+
+from local_socket import default_socket, require_authkey, serve
+from metrics import REGISTRY
+
+log = logging.getLogger(__name__)
+
+PUBLISHED = REGISTRY.counter("ruric_pubsub_published", "Events published", ["via"])
+DROPPED = REGISTRY.counter("ruric_pubsub_dropped", "Events dropped for subscribers that fell behind")
+
+
+class Subscription:
+    def __init__(self, broker, topics, max_pending):
+        self.broker = broker
+        self.topics = tuple(topics)
+        self._queue = queue.Queue(max_pending)
+        self.lagged = False  # events were dropped: the client should re-fetch history
+
+    def deliver(self, topic, event):
+        try:
+            self._queue.put_nowait((topic, event))
+        except queue.Full:
+            # never block the publisher on a slow reader; it is told to resync instead
+            self.lagged = True
+            DROPPED.inc()
+
+    def get(self, timeout):
+        """(topic, event), or None if nothing arrived within `timeout` seconds."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class EventBroker:
+    def __init__(self, address=None, authkey=None, max_pending=100):
+        self.address = address
+        self.authkey = authkey
+        self.max_pending = max_pending  # per-subscriber buffer
+        self._topics = {}  # topic -> set of Subscription
+        self._lock = threading.Lock()
+        self._relay = None  # connection to the relay, owned by the reader thread
+        self._send_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        REGISTRY.gauge("ruric_pubsub_subscribers", "Open event subscriptions in this worker",
+                       fn=lambda: len(self._subscriptions()))
+
+    def init_app(self, app):
+        self.address = app.config.get("PUBSUB_SOCKET") or None
+        if self.address:
+            self.authkey = require_authkey(app.config.get("PUBSUB_AUTHKEY"), "PUBSUB_AUTHKEY")
+        self.max_pending = int(app.config.get("PUBSUB_MAX_PENDING", self.max_pending))
+
+    # ---- public ----
+    def subscribe(self, *topics):
+        return self.attach(Subscription(self, topics, self.max_pending))
+
+    def attach(self, sub):
+        # subscribe an already-built Subscription (events_server.py uses an asyncio-aware one)
+        with self._lock:
+            for topic in sub.topics:
+                self._topics.setdefault(topic, set()).add(sub)
+        if self.address:
+            self._ensure_thread()
+        return sub
+
+    def connect(self):
+        # start the relay connection before the first subscriber (no-op without a relay)
+        if self.address:
+            self._ensure_thread()
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            for topic in sub.topics:
+                subs = self._topics.get(topic)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._topics[topic]
+
+    def publish(self, topics, event):
+        """Deliver `event` (a JSON-able dict) to every subscriber of any of `topics`."""
+        topics = tuple(topics)
+        if self.address:
+            self._ensure_thread()
+            if self._send((topics, event)):
+                PUBLISHED.inc(via="relay")
+                return
+            log.warning("pubsub relay %s unreachable; delivering to this worker only", self.address)
+        PUBLISHED.inc(via="local")
+        self._dispatch(topics, event)
+
+    def stats(self):
+        return {
+            "relay": self.address,
+            "relay_connected": self._relay is not None,
+            "subscribers": len(self._subscriptions()),
+            "topics": len(self._topics),
+        }
+
+    # ---- internals ----
+    def _subscriptions(self):
+        with self._lock:
+            return {sub for subs in self._topics.values() for sub in subs}
+
+    def _dispatch(self, topics, event):
+        with self._lock:
+            targets = {sub: topic for topic in topics for sub in self._topics.get(topic, ())}
+        for sub, topic in targets.items():
+            sub.deliver(topic, event)
+
+    def _send(self, message):
+        with self._send_lock:
+            conn = self._relay
+            if conn is None:
+                return False
+            try:
+                conn.send(message)
+                return True
+            except (OSError, EOFError, ValueError):
+                return False
+
+    def _ensure_thread(self):
+        # one reader per worker, (re)started after a fork — threads don't survive fork()
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._relay = None  # the parent's socket is not ours
+            self._thread = threading.Thread(target=self._read_relay, name="pubsub-relay", daemon=True)
+            self._thread.start()
+        # give the first publish a chance to go through the relay instead of falling back
+        deadline = time.monotonic() + 0.5
+        while self._relay is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def _read_relay(self):
+        delay = 0.1
+        while True:
+            try:
+                conn = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+            except (OSError, EOFError, AuthenticationError) as e:
+                log.debug("pubsub relay %s not reachable: %s", self.address, e)
+                time.sleep(delay)
+                delay = min(delay * 2, 5.0)
+                continue
+            delay = 0.1
+            self._relay = conn
+            log.info("connected to pubsub relay %s", self.address)
+            try:
+                while True:
+                    topics, event = conn.recv()
+                    self._dispatch(topics, event)
+            except (OSError, EOFError):
+                log.warning("lost pubsub relay %s; reconnecting", self.address)
+            finally:
+                with self._send_lock:
+                    self._relay = None
+                conn.close()
+
+
+# ------------------------
+# relay: every message from any worker goes out to all connected workers (sender included)
+# ------------------------
+def serve_relay(address, authkey):
+    conns, lock = [], threading.Lock()
+
+    def forward(conn):
+        with lock:
+            conns.append(conn)
+        try:
+            while True:
+                message = conn.recv()
+                with lock:
+                    for other in list(conns):
+                        try:
+                            other.send(message)
+                        except (OSError, EOFError):
+                            conns.remove(other)
+        except (OSError, EOFError):
+            pass
+        finally:
+            with lock:
+                if conn in conns:
+                    conns.remove(conn)
+            conn.close()
+
+    serve(address, authkey, forward, "pubsub relay")
+
+
+def main():
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    parser = argparse.ArgumentParser(description="Cross-worker relay for chat push events")
+    parser.add_argument("--socket", default=os.getenv("PUBSUB_SOCKET") or default_socket("pubsub.sock"))
+    args = parser.parse_args()
+    try:
+        authkey = require_authkey(os.getenv("PUBSUB_AUTHKEY", ""), "PUBSUB_AUTHKEY")
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+    serve_relay(args.socket, authkey)
+
+
+if __name__ == "__main__":
+    main()
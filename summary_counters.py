@@ -0,0 +1,134 @@
+# summary_counters.py
+# Dashboard counters for /admin/summary, kept in memory so a dashboard poll never touches MySQL:
+#   - one background thread per worker recounts everything every `refresh_interval` seconds
+#     (a single statement with four COUNT(*) subqueries, see migrations/003 for its indexes)
+#   - signup / attendance (and order writes, via add()) bump the counts right after their commit,
+#     so the worker that handled the write shows it immediately; other workers and any drift
+#     (e.g. a write racing a recount, rows changed outside the app) converge at the next recount
+#   - present_today is only for MySQL's current date (attendance rows use CURDATE()): the recount
+#     also returns CURDATE() and how many seconds are left of that day on the MySQL clock, and
+#     every add() / get() checks that deadline, so after MySQL's midnight the count restarts at 0
+#     instead of adding today's attendance to yesterday's — the app host's clock and time zone
+#     are never used for the day boundary (the next recount confirms it)
+import datetime
+import logging
+import os
+import threading
+import time
+
+from metrics import REGISTRY
+
+log = logging.getLogger(__name__)
+
+COUNT_SQL = """
+    SELECT (SELECT COUNT(*) FROM users WHERE role = 'employee'),
+           (SELECT COUNT(*) FROM users WHERE role = 'client'),
+           (SELECT COUNT(*) FROM orders),
+           (SELECT COUNT(*) FROM attendance WHERE date = CURDATE() AND status = 'Present'),
+           CURDATE(),
+           TIMESTAMPDIFF(SECOND, NOW(), CURDATE() + INTERVAL 1 DAY)
+"""
+COUNTERS = ("employees", "clients", "orders", "present_today")
+
+REFRESH_SECONDS = REGISTRY.histogram("ruric_admin_summary_refresh_seconds", "Time to recount the admin summary")
+
+
+class SummaryCounters:
+    def __init__(self, pool=None, refresh_interval=30.0):
+        self.pool = pool
+        self.refresh_interval = refresh_interval
+        self._counts = None  # {counter: value}, None until the first recount
+        self._day = None  # CURDATE() of the last recount
+        self._day_ends_at = None  # time.monotonic() at which MySQL's CURDATE() moves past _day
+        self._as_of = None  # wall-clock time of the last recount
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.refreshes = self.errors = 0
+        REGISTRY.gauge("ruric_admin_summary_age_seconds", "Seconds since the admin summary was recounted",
+                       fn=lambda: time.time() - self._as_of if self._as_of else 0.0)
+
+    def init_app(self, app, pool):
+        self.pool = pool
+        self.refresh_interval = float(app.config.get("ADMIN_SUMMARY_REFRESH_SECONDS", self.refresh_interval))
+
+    # ---- public ----
+    def get(self):
+        """Current counts plus `as_of` (ISO time of the last recount) and `day`."""
+        self._ensure_thread()
+        with self._lock:
+            stale = self._counts is None or time.time() - self._as_of > 2 * self.refresh_interval
+        if stale:
+            # first call in this worker, or the refresher is failing: recount inline once
+            try:
+                self.refresh()
+            except Exception:
+                if self._counts is None:
+                    raise
+                log.warning("admin summary recount failed; serving counts as of the last recount")
+        with self._lock:
+            self._roll_over()
+            snapshot = dict(self._counts)
+            as_of, day = self._as_of, self._day
+        snapshot["as_of"] = time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(as_of))
+        snapshot["day"] = str(day)
+        return snapshot
+
+    def add(self, counter, amount=1):
+        # called after a committed write; before the first recount there is nothing to adjust
+        with self._lock:
+            if self._counts is not None:
+                self._roll_over()
+                self._counts[counter] += amount
+
+    def _roll_over(self):
+        # caller holds the lock
+        while time.monotonic() >= self._day_ends_at:
+            self._counts["present_today"] = 0
+            if isinstance(self._day, datetime.date):
+                self._day += datetime.timedelta(days=1)
+            self._day_ends_at += 86400.0
+
+    def add_user(self, role):
+        if role == "employee":
+            self.add("employees")
+        elif role == "client":
+            self.add("clients")
+
+    def refresh(self):
+        conn = self.pool.acquire()
+        try:
+            with REFRESH_SECONDS.time():
+                cur = conn.cursor()
+                cur.execute(COUNT_SQL)
+                row = cur.fetchone()
+                cur.close()
+        except Exception:
+            self.errors += 1
+            self.pool.release(conn, discard=True)
+            raise
+        self.pool.release(conn)
+        with self._lock:
+            self._counts = dict(zip(COUNTERS, (int(v) for v in row[:4])))
+            self._day = row[4]
+            self._day_ends_at = time.monotonic() + float(row[5])
+            self._as_of = time.time()
+            self.refreshes += 1
+
+    # ---- refresher thread ----
+    def _ensure_thread(self):
+        # started on first use in each worker — threads don't survive fork()
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="admin-summary", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh()
+            except Exception:
+                log.exception("admin summary recount failed")
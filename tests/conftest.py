@@ -0,0 +1,7 @@
+# tests/conftest.py
+# Tests import the flat root modules directly and never load the fallback model.
+import os
+import sys
+
+os.environ.setdefault("MODEL_LOAD", "off")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
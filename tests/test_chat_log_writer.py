@@ -0,0 +1,101 @@
+# The write-behind writer must not let one bad row stop chat persistence for everything behind it,
+# and must only report rows (with their chat_id) once they are committed.
+import time
+
+import pytest
+
+from chat_log_writer import ChatLogBacklogFull, ChatLogWriter, chat_log_row
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.lastrowid = None
+
+    def executemany(self, query, rows):
+        if "chat_logs" in query:
+            # auto-increment: the first id of this multi-row insert
+            self.lastrowid = len(self.conn.table) + len(self.conn.staged) + 1
+            self.conn.staged += list(rows)
+
+    def close(self):
+        pass
+
+
+class FakeConn:
+    def __init__(self, table):
+        self.table = table
+        self.staged = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.table += self.staged
+        self.staged = []
+
+
+class FakePool:
+    def __init__(self):
+        self.table = []
+
+    def acquire(self):
+        return FakeConn(self.table)
+
+    def release(self, conn, discard=False):
+        pass
+
+
+def test_bad_row_does_not_block_later_rows(tmp_path):
+    pool = FakePool()
+    dead_letter = tmp_path / "dead.jsonl"
+    writer = ChatLogWriter(pool, max_batch=10, flush_interval=0.01, dead_letter_path=str(dead_letter))
+    writer.append((1, 2, "before", "client_employee"))
+    writer.append(("abc", 2, "bad id", "client_employee"))  # int('abc') fails in the summary upsert
+    writer.append((2, 1, "after", "employee_client"))
+
+    assert writer.flush(3.0)
+    assert [row[2] for row in pool.table] == ["before", "after"]
+    assert writer.stats()["dead_letters"] == 1
+    assert "bad id" in dead_letter.read_text()
+
+
+def test_chat_log_row_rejects_non_numeric_ids():
+    assert chat_log_row("5", 10, "hi", "client_ai") == (5, 10, "hi", "client_ai")
+    with pytest.raises(ValueError):
+        chat_log_row("abc", 10, "hi", "client_ai")
+
+
+def test_written_rows_are_reported_with_chat_ids_after_commit():
+    pool = FakePool()
+    writer = ChatLogWriter(pool, max_batch=10, flush_interval=0.01)
+    reported = []
+    writer.on_write(lambda written: reported.extend((chat_id, row[2], len(pool.table)) for chat_id, row in written))
+    writer.append((1, 2, "first", "client_employee"), (2, 1, "second", "employee_client"))
+    writer.append((1, 2, "third", "client_employee"))
+
+    assert writer.flush(3.0)
+    assert [(chat_id, message) for chat_id, message, _ in reported] == [(1, "first"), (2, "second"), (3, "third")]
+    # every callback ran after its rows were in the table
+    assert all(committed >= chat_id for chat_id, _, committed in reported)
+
+
+class DownPool:
+    """MySQL unreachable: every acquire fails with a transient error, so the writer keeps retrying."""
+
+    def acquire(self):
+        raise OSError("Can't connect to MySQL server")
+
+    def release(self, conn, discard=False):
+        pass
+
+
+def test_append_gives_up_when_mysql_is_down_and_the_queue_is_full():
+    writer = ChatLogWriter(DownPool(), max_batch=1, flush_interval=0.01, max_pending=2, append_timeout=0.2)
+    writer.append((1, 2, "queued", "client_employee"), (1, 2, "queued", "client_employee"))
+
+    started = time.monotonic()
+    with pytest.raises(ChatLogBacklogFull):
+        for _ in range(5):
+            writer.append((1, 2, "waits", "client_employee"))
+    assert time.monotonic() - started < 2.0  # bounded by append_timeout, not by the outage
@@ -0,0 +1,110 @@
+# /chat/events: a stream must give back what it holds (subscription, worker slot) as soon as the
+# client is gone, and the asyncio events server must deliver published messages to open streams.
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+
+import app as app_module
+from events_server import EventsServer
+from pubsub import EventBroker
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+# ---- in-worker route (dev server / no relay) ----
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app_module, "event_stream_slots", threading.BoundedSemaphore(1))
+    return app_module.app.test_client()
+
+
+def test_worker_stream_slot_is_released_on_disconnect(client):
+    first = client.get("/chat/events/5/6", buffered=False)
+    assert first.status_code == 200
+    assert client.get("/chat/events/5/6").status_code == 503  # the only slot is taken
+
+    first.close()  # client went away without reading a single event
+    assert app_module.events.stats()["subscribers"] == 0
+    second = client.get("/chat/events/5/6", buffered=False)
+    assert second.status_code == 200
+    second.close()
+
+
+# ---- events_server.py ----
+@pytest.fixture
+def events_server():
+    broker = EventBroker()
+    server = EventsServer(broker, origins=("http://localhost:3000",), keepalive=10, max_seconds=30)
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    holder = {}
+
+    def run():
+        asyncio.set_event_loop(loop)
+        holder["server"] = loop.run_until_complete(server.start("127.0.0.1", 0))
+        started.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert started.wait(3.0)
+    port = holder["server"].sockets[0].getsockname()[1]
+    yield server, broker, port
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(3.0)
+
+
+def open_stream(port, path):
+    conn = socket.create_connection(("127.0.0.1", port), timeout=3.0)
+    conn.sendall(f"GET {path} HTTP/1.1\r\nHost: x\r\nOrigin: http://localhost:3000\r\n\r\n".encode())
+    return conn
+
+
+def read_until(conn, marker):
+    data = b""
+    while marker not in data:
+        chunk = conn.recv(4096)
+        assert chunk, f"connection closed before {marker!r}"
+        data += chunk
+    return data
+
+
+def test_events_server_delivers_published_messages(events_server):
+    server, broker, port = events_server
+    conn = open_stream(port, "/chat/events/6/5")
+    head = read_until(conn, b"retry: 2000")
+    assert b"200 OK" in head and b"text/event-stream" in head
+    assert b"Access-Control-Allow-Origin: http://localhost:3000" in head
+
+    wait_for(lambda: server.streams == 1)
+    broker.publish(("conv:5:6", "user:6"), {"chat_id": 42, "message": "hi"})
+    assert b'"chat_id": 42' in read_until(conn, b'"chat_id": 42')
+    conn.close()
+
+
+def test_events_server_releases_stream_on_disconnect(events_server):
+    server, broker, port = events_server
+    conns = [open_stream(port, f"/chat/events/{user_id}") for user_id in range(1, 51)]
+    for conn in conns:
+        read_until(conn, b"retry: 2000")
+    wait_for(lambda: server.streams == 50)  # far more than a gthread worker has threads
+
+    for conn in conns:
+        conn.close()
+    wait_for(lambda: server.streams == 0, timeout=1.0)  # before the next keepalive would notice
+    assert broker.stats()["subscribers"] == 0
+
+
+def test_events_server_unknown_path(events_server):
+    _, _, port = events_server
+    conn = open_stream(port, "/chat/history/1/2")
+    assert b"404 Not Found" in read_until(conn, b"\r\n\r\n")
+    conn.close()
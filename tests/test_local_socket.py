@@ -0,0 +1,54 @@
+# The pickle sockets (inference server, pubsub relay) must never listen without an authkey or
+# where other users can reach them.
+import os
+import stat
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+
+import pytest
+
+from local_socket import require_authkey, serve
+
+
+def echo(conn):
+    with conn:
+        conn.send(conn.recv())
+
+
+def start(address, authkey=b"secret"):
+    threading.Thread(target=serve, args=(address, authkey, echo, "test"), daemon=True).start()
+    for _ in range(100):
+        if os.path.exists(address):
+            return
+        time.sleep(0.01)
+    raise AssertionError("listener did not start")
+
+
+def test_refuses_to_listen_without_an_authkey(tmp_path):
+    with pytest.raises(RuntimeError):
+        serve(str(tmp_path / "private" / "s.sock"), None, echo, "test")
+    with pytest.raises(RuntimeError):
+        require_authkey("", "INFERENCE_AUTHKEY")
+
+
+def test_socket_is_private_and_needs_the_authkey(tmp_path):
+    address = str(tmp_path / "private" / "s.sock")
+    start(address)
+    assert stat.S_IMODE(os.stat(address).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(os.path.dirname(address)).st_mode) == 0o700
+
+    with Client(address, family="AF_UNIX", authkey=b"secret") as conn:
+        conn.send({"op": "ping"})
+        assert conn.recv() == {"op": "ping"}
+    with pytest.raises(AuthenticationError):
+        Client(address, family="AF_UNIX", authkey=b"wrong")
+
+
+def test_refuses_a_shared_directory(tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir(mode=0o777)
+    os.chmod(shared, 0o777)
+    with pytest.raises(RuntimeError):
+        serve(str(shared / "s.sock"), b"secret", echo, "test")
@@ -0,0 +1,31 @@
+# MODEL_LOAD=lazy: fallback requests must get the default reply while the model loads, not wait for it.
+import threading
+import time
+
+import nlp_model
+
+
+def test_requests_do_not_wait_for_a_lazy_load(monkeypatch):
+    loading = threading.Event()
+    release = threading.Event()
+
+    def slow_load():
+        with nlp_model._model_lock:
+            loading.set()
+            release.wait(5.0)
+            nlp_model.MODEL_STATE["status"] = "ready"
+
+    monkeypatch.setattr(nlp_model, "MODEL_LOAD", "lazy")
+    monkeypatch.setattr(nlp_model, "INFERENCE", None)
+    monkeypatch.setattr(nlp_model, "load_model", slow_load)
+    monkeypatch.setattr(nlp_model, "_warmup_thread", None)
+    monkeypatch.setitem(nlp_model.MODEL_STATE, "status", "not_started")
+    try:
+        assert not nlp_model._model_available()  # starts the load
+        assert loading.wait(2.0)
+        started = time.monotonic()
+        assert not nlp_model._model_available()
+        assert time.monotonic() - started < 0.5
+    finally:
+        release.set()
+        nlp_model._warmup_thread.join(5.0)
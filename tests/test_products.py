@@ -0,0 +1,116 @@
+# /products is served from an in-memory snapshot: cursor pages must cover the catalog exactly
+# once, newest first, and an unchanged catalog must answer If-None-Match with 304.
+import datetime
+from decimal import Decimal
+
+import pytest
+
+import app as app_module
+
+
+def product_row(product_id, day, price="100.00", stock=5):
+    return (product_id, f"Product {product_id}", f"Description {product_id}", Decimal(price), stock,
+            f"/images/{product_id}.png", datetime.datetime(2026, 10, day, 9, 0, 0))
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, query, args=None):
+        pass
+
+    def fetchall(self):
+        # SELECT_PRODUCTS orders newest first
+        return sorted(self.rows, key=lambda r: (r[6], r[0]), reverse=True)
+
+    def close(self):
+        pass
+
+
+class FakePool:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def acquire(self):
+        pool = self
+
+        class Conn:
+            def cursor(self):
+                return FakeCursor(pool.rows)
+        return Conn()
+
+    def release(self, conn, discard=False):
+        pass
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    # two products share a created_at day: the cursor must break the tie on product_id
+    rows = [product_row(1, 1), product_row(2, 2, stock=0), product_row(3, 2), product_row(4, 3, price="900.00"),
+            product_row(5, 4), product_row(6, 5, stock=0), product_row(7, 6)]
+    pool = FakePool(rows)
+    monkeypatch.setattr(app_module.catalog, "pool", pool)
+    monkeypatch.setattr(app_module.catalog, "ttl", 3600.0)
+    monkeypatch.setattr(app_module.catalog, "_snapshot", None)
+    return pool
+
+
+@pytest.fixture
+def client():
+    return app_module.app.test_client()
+
+
+def fetch_all_pages(client, query):
+    ids, cursor, pages = [], None, 0
+    while True:
+        url = f"/products?{query}" + (f"&cursor={cursor}" if cursor else "")
+        response = client.get(url)
+        assert response.status_code == 200
+        ids += [p["product_id"] for p in response.get_json()]
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return ids, pages
+
+
+def test_cursor_pages_cover_the_catalog_once_newest_first(catalog, client):
+    ids, pages = fetch_all_pages(client, "limit=2")
+    assert ids == [7, 6, 5, 4, 3, 2, 1]
+    assert pages == 4
+
+
+def test_cursor_pages_with_filters(catalog, client):
+    ids, _ = fetch_all_pages(client, "limit=2&in_stock=1&max_price=500")
+    assert ids == [7, 5, 3, 1]
+
+
+def test_bad_cursor_is_a_400(catalog, client):
+    assert client.get("/products?limit=2&cursor=nonsense").status_code == 400
+
+
+def test_unchanged_catalog_revalidates_with_304(catalog, client):
+    first = client.get("/products")
+    etag = first.headers["ETag"]
+    assert [p["product_id"] for p in first.get_json()] == [7, 6, 5, 4, 3, 2, 1]
+
+    again = client.get("/products", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+    assert again.data == b""
+
+    # every parameter set has its own ETag
+    paged = client.get("/products?limit=2")
+    assert paged.headers["ETag"] != etag
+    assert client.get("/products?limit=2", headers={"If-None-Match": paged.headers["ETag"]}).status_code == 304
+
+
+def test_catalog_change_gives_a_new_etag(catalog, client):
+    etag = client.get("/products").headers["ETag"]
+    catalog.rows.append(product_row(8, 7))
+    app_module.catalog.reload()
+
+    response = client.get("/products", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.get_json()[0]["product_id"] == 8
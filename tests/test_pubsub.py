@@ -0,0 +1,59 @@
+# Chat push fan-out: every subscriber of a topic gets each event once, in this worker and, through
+# the relay, in every other worker.
+import threading
+import time
+
+from pubsub import EventBroker, serve_relay
+
+
+def test_publish_reaches_every_subscriber_of_its_topics_once():
+    broker = EventBroker()
+    chat_window = broker.subscribe("conv:1:2")
+    inbox = broker.subscribe("user:2")
+    both = broker.subscribe("conv:1:2", "user:2")
+    other = broker.subscribe("conv:3:4")
+
+    broker.publish(("conv:1:2", "user:2"), {"chat_id": 7})
+
+    assert chat_window.get(0.1) == ("conv:1:2", {"chat_id": 7})
+    assert inbox.get(0.1) == ("user:2", {"chat_id": 7})
+    assert both.get(0.1)[1] == {"chat_id": 7}
+    assert both.get(0.01) is None  # subscribed to both topics, delivered once
+    assert other.get(0.01) is None
+
+
+def test_slow_subscriber_is_marked_lagged_instead_of_blocking():
+    broker = EventBroker(max_pending=2)
+    sub = broker.subscribe("user:2")
+    for chat_id in range(5):
+        broker.publish(("user:2",), {"chat_id": chat_id})
+    assert sub.lagged
+    assert [sub.get(0.01)[1]["chat_id"] for _ in range(2)] == [0, 1]
+
+
+def test_closed_subscription_gets_nothing():
+    broker = EventBroker()
+    with broker.subscribe("user:2") as sub:
+        pass
+    broker.publish(("user:2",), {"chat_id": 1})
+    assert sub.get(0.01) is None
+    assert broker.stats()["subscribers"] == 0
+
+
+def test_relay_fans_out_across_workers(tmp_path):
+    address = str(tmp_path / "private" / "pubsub.sock")
+    threading.Thread(target=serve_relay, args=(address, b"secret"), daemon=True).start()
+    worker_a = EventBroker(address, b"secret")
+    worker_b = EventBroker(address, b"secret")
+    sub_b = worker_b.subscribe("user:2")
+    sub_a = worker_a.subscribe("user:2")
+    deadline = time.monotonic() + 5.0
+    while not (worker_a.stats()["relay_connected"] and worker_b.stats()["relay_connected"]):
+        assert time.monotonic() < deadline, "workers never connected to the relay"
+        time.sleep(0.01)
+
+    worker_a.publish(("user:2",), {"chat_id": 9})
+
+    assert sub_b.get(2.0) == ("user:2", {"chat_id": 9})
+    assert sub_a.get(2.0) == ("user:2", {"chat_id": 9})  # echoed back, not delivered twice
+    assert sub_a.get(0.1) is None
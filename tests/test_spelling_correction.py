@@ -0,0 +1,32 @@
+# Spelling correction must only ever help an FAQ lookup: correctly spelled messages are not
+# rewritten into trigger words and sent to the help / emotional intents.
+import pytest
+
+import nlp_model
+from intent_router import FAQ_INTENT
+
+
+@pytest.fixture(scope="module")
+def index():
+    return nlp_model.faq_index()
+
+
+@pytest.mark.parametrize("message", [
+    "is mango in stock",   # stock -> stuck (help)
+    "my order is late",    # late -> hate (emotional)
+    "i live in manila",    # live -> love (emotional)
+    "my bike",             # bike -> like (emotional)
+])
+def test_known_words_are_not_corrected_into_intents(index, message):
+    result = nlp_model._match_rules_and_faq(message, index)
+    assert result is None or result.intent == FAQ_INTENT
+
+
+def test_misspelled_faq_question_still_matches(index):
+    result = nlp_model._match_rules_and_faq("can i trak my delivry", index)
+    assert result is not None and result.intent == FAQ_INTENT
+
+
+def test_correction_vocab_is_faq_question_words(index):
+    assert "stuck" not in index.fuzzy.vocab
+    assert index.fuzzy.correct("is mango in stock", nlp_model.FAQ_FUZZY_DISTANCE) == "is mango in stock"
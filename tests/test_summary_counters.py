@@ -0,0 +1,64 @@
+# present_today belongs to MySQL's current date: it restarts at 0 when MySQL's day ends, whatever
+# the app host's clock says.
+import datetime
+import time
+
+from summary_counters import SummaryCounters
+
+
+class FakeCursor:
+    def __init__(self, row):
+        self.row = row
+
+    def execute(self, query, args=None):
+        pass
+
+    def fetchone(self):
+        return self.row
+
+    def close(self):
+        pass
+
+
+class FakePool:
+    def __init__(self, row):
+        self.row = row
+
+    def acquire(self):
+        pool = self
+
+        class Conn:
+            def cursor(self):
+                return FakeCursor(pool.row)
+        return Conn()
+
+    def release(self, conn, discard=False):
+        pass
+
+
+def counters(seconds_left_today, day=datetime.date(2026, 10, 18)):
+    # employees, clients, orders, present_today, CURDATE(), seconds until MySQL's midnight
+    summary = SummaryCounters(FakePool((4, 20, 9, 3, day, seconds_left_today)))
+    summary.refresh()
+    return summary
+
+
+def test_present_today_restarts_when_mysql_day_ends():
+    summary = counters(seconds_left_today=0.05)
+    summary.add("present_today")
+    assert summary._counts["present_today"] == 4
+
+    time.sleep(0.1)  # MySQL's midnight passes before the next recount
+    summary.add("present_today")
+    summary.add("orders")
+    assert summary._counts["present_today"] == 1  # today's first attendance, not yesterday's 5th
+    assert summary._counts["orders"] == 10  # other counters are not per day
+    assert summary._day == datetime.date(2026, 10, 19)
+
+
+def test_app_host_date_does_not_matter():
+    # MySQL's day has hours left even if the app host already thinks (or not yet) it's tomorrow
+    summary = counters(seconds_left_today=3 * 3600, day=datetime.date.today() - datetime.timedelta(days=1))
+    summary.add("present_today")
+    assert summary._counts["present_today"] == 4
+    assert summary._day == datetime.date.today() - datetime.timedelta(days=1)
@@ -0,0 +1,46 @@
+# worker_memory.py
+# Unique vs shared memory of a process, read from /proc (Linux). Under gunicorn --preload the
+# model weights are loaded once in the master and shared copy-on-write with every worker, so a
+# healthy worker shows the model under "shared" and only its own request state under "unique".
+import os
+
+# smaps fields (kB) we report; unique = Private_*, shared = Shared_*
+_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty", "Swap")
+
+
+def _read_smaps(pid):
+    # smaps_rollup (Linux 4.14+) is one pre-summed block; plain smaps has one block per mapping
+    for name in ("smaps_rollup", "smaps"):
+        try:
+            with open(f"/proc/{pid}/{name}") as f:
+                lines = f.readlines()
+        except OSError:
+            continue
+        totals = dict.fromkeys(_FIELDS, 0)
+        for line in lines:
+            key, _, rest = line.partition(":")
+            if key in totals:
+                totals[key] += int(rest.split()[0])
+        return totals
+    return None
+
+
+def memory_usage(pid="self"):
+    """{"unique_mb", "shared_mb", "rss_mb", "pss_mb", "swap_mb"} for `pid`, or {"available": False}."""
+    kb = _read_smaps(pid)
+    if kb is None:
+        return {"available": False}
+    mb = lambda v: round(v / 1024.0, 1)  # noqa: E731
+    return {
+        "available": True,
+        "unique_mb": mb(kb["Private_Clean"] + kb["Private_Dirty"]),
+        "shared_mb": mb(kb["Shared_Clean"] + kb["Shared_Dirty"]),
+        "rss_mb": mb(kb["Rss"]),
+        "pss_mb": mb(kb["Pss"]),
+        "swap_mb": mb(kb["Swap"]),
+    }
+
+
+def worker_report():
+    """This process' memory plus its pid / parent pid (the gunicorn master when forked)."""
+    return {"pid": os.getpid(), "ppid": os.getppid(), **memory_usage()}